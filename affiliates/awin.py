@@ -1,29 +1,59 @@
-import requests
 import os
 from datetime import datetime, timedelta
 
-AWIN_API_URL = "https://api.awin.com/publishers/{publisher_id}/transactions"
+import http_client
+from affiliates.base import AffiliateNetwork, REGISTRY, parse_utc, register
+
+AWIN_API_URL = os.getenv("AWIN_API_URL", "https://api.awin.com/publishers/{publisher_id}/transactions")
 AWIN_API_TOKEN = os.getenv("AWIN_API_TOKEN")
 AWIN_PUBLISHER_ID = os.getenv("AWIN_PUBLISHER_ID")
+WINDOW_DAYS = 7  # Awin returns a whole date range in one response (max 31 days), so we page by window
+
+@register
+class Awin(AffiliateNetwork):
+    name = "awin"
+
+    def configured(self):
+        return bool(AWIN_API_TOKEN and AWIN_PUBLISHER_ID)
+
+    def iter_transactions(self, since: datetime, until: datetime):
+        """Yield approved transactions validated in [since, until), one request per date window."""
+        url = AWIN_API_URL.format(publisher_id=AWIN_PUBLISHER_ID)
+        headers = {"Authorization": f"Bearer {AWIN_API_TOKEN}"}
+        start = since
+        while start < until:
+            end = min(start + timedelta(days=WINDOW_DAYS), until)
+            params = {
+                "startDate": start.strftime("%Y-%m-%dT%H:%M:%S"),
+                "endDate": end.strftime("%Y-%m-%dT%H:%M:%S"),
+                "timezone": "UTC",
+                "dateType": "validation",
+                "status": "approved",
+            }
+            print("[poll_awin] checking approvals", params["startDate"], "->", params["endDate"])
+            resp = http_client.get(url, headers=headers, params=params, timeout=30)
+            if resp.status_code != 200:
+                raise RuntimeError(f"Awin API error {resp.status_code}: {resp.text[:500]}")
+            yield from resp.json()
+            start = end
+
+    def transaction_id(self, tx):
+        return str(tx["id"])
+
+    def transaction_time(self, tx):
+        return parse_utc(tx.get("validationDate") or tx.get("transactionDate"))
+
+    def to_offer(self, tx):
+        link = tx.get("url") or tx.get("publisherUrl")
+        if not link:
+            return None
+        return {"link": link}
 
 def poll_awin_approvals(_=None):
-    if not (AWIN_API_TOKEN and AWIN_PUBLISHER_ID):
+    """Ingest approved Awin transactions newer than the stored high-water mark."""
+    network = REGISTRY["awin"]
+    if not network.configured():
         print("[poll_awin] missing credentials")
-        return []
-
-    since = (datetime.utcnow() - timedelta(days=2)).strftime("%Y-%m-%d")
-    url = AWIN_API_URL.format(publisher_id=AWIN_PUBLISHER_ID)
-    params = {
-        "startDate": since,
-        "endDate": datetime.utcnow().strftime("%Y-%m-%d"),
-        "status": "approved",
-    }
-    headers = {"Authorization": f"Bearer {AWIN_API_TOKEN}"}
-
-    print("[poll_awin] checking approvals since", since)
-    resp = requests.get(url, headers=headers, params=params)
-    if resp.status_code != 200:
-        print("[poll_awin] API error:", resp.status_code, resp.text)
-        return []
-
-    return resp.json()
+        return {"network": network.name, "fetched": 0, "new": 0, "offers_added": 0}
+    from affiliates.ingest import ingest
+    return ingest(network)
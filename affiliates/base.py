@@ -0,0 +1,52 @@
+# affiliates/base.py
+"""Shared interface and registry for affiliate network adapters.
+
+A network is a subclass of AffiliateNetwork decorated with @register. Adding a network
+means adding one module with one class and listing it in affiliates/poller.py; the
+ingestion pipeline (affiliates/ingest.py) and the poller only talk to this interface.
+"""
+from datetime import datetime, timezone
+
+REGISTRY = {}
+
+
+def register(cls):
+    REGISTRY[cls.name] = cls()
+    return cls
+
+
+class AffiliateNetwork:
+    name = ""
+
+    def configured(self) -> bool:
+        """True when credentials for this network are present."""
+        raise NotImplementedError
+
+    def iter_transactions(self, since: datetime, until: datetime):
+        """Yield raw approved transactions in [since, until), fetching page by page."""
+        raise NotImplementedError
+
+    def transaction_id(self, tx) -> str:
+        raise NotImplementedError
+
+    def transaction_time(self, tx):
+        """Naive UTC datetime used to advance the high-water mark."""
+        raise NotImplementedError
+
+    def to_offer(self, tx):
+        """Map a transaction to a poster offer, or None.
+
+        An offer is {"link"} plus optional "product" / "product_type" for the caption
+        engine (poster/captions.py), or a ready "post_text".
+        """
+        return None
+
+
+def parse_utc(stamp):
+    """Parse an ISO-8601 timestamp from an affiliate API into a naive UTC datetime."""
+    if not stamp:
+        return None
+    dt = datetime.fromisoformat(str(stamp).replace("Z", "+00:00"))
+    if dt.tzinfo:
+        dt = dt.astimezone(timezone.utc).replace(tzinfo=None)
+    return dt
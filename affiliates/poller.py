@@ -0,0 +1,154 @@
+# affiliates/poller.py
+"""Polls every enabled affiliate network concurrently.
+
+Networks come from the registry in affiliates/base.py and are switched on/off with
+`affiliates.<name>.enabled` in config.yaml. Each poll runs in its own thread with its
+own app context and timeout, so total latency is that of the slowest network rather
+than the sum, and a network that keeps failing is skipped by its circuit breaker
+until the cooldown passes.
+"""
+import importlib
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+import config
+import instrumentation
+from affiliates.base import REGISTRY
+
+NETWORK_MODULES = ("affiliates.awin", "affiliates.rakuten")
+
+
+def poller_settings():
+    settings = {"timeout_seconds": 120, "failure_threshold": 3, "cooldown_seconds": 900}
+    settings.update(config.section("affiliate_poller"))
+    return settings
+
+
+class CircuitBreaker:
+    """closed -> open after `failure_threshold` consecutive failures; one trial call after `cooldown`."""
+
+    def __init__(self, failure_threshold: int, cooldown: float):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self.lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        return "half-open" if time.monotonic() - self.opened_at >= self.cooldown else "open"
+
+    def allow(self):
+        with self.lock:
+            if self.state == "open":
+                return False
+            if self.state == "half-open":
+                # let exactly one trial through; it re-opens the breaker if it fails
+                self.opened_at = time.monotonic()
+            return True
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+
+
+_breakers = {}
+_running = set()
+_running_lock = threading.Lock()
+
+
+def load_networks():
+    for module in NETWORK_MODULES:
+        importlib.import_module(module)
+    return REGISTRY
+
+
+def enabled_networks():
+    settings = config.section("affiliates")
+    return [
+        network for name, network in load_networks().items()
+        if (settings.get(name) or {}).get("enabled", True)
+    ]
+
+
+def breaker_for(name: str):
+    if name not in _breakers:
+        s = poller_settings()
+        _breakers[name] = CircuitBreaker(int(s["failure_threshold"]), float(s["cooldown_seconds"]))
+    return _breakers[name]
+
+
+def _run(flask_app, network):
+    from affiliates.ingest import ingest
+    from models import db
+
+    try:
+        with flask_app.app_context(), instrumentation.AFFILIATE_POLL.time(network=network.name):
+            try:
+                return ingest(network)
+            except Exception:
+                db.session.rollback()
+                raise
+    finally:
+        with _running_lock:
+            _running.discard(network.name)
+
+
+def poll_all(flask_app):
+    """Ingest from every enabled network in parallel; returns one summary dict per network."""
+    settings = config.section("affiliates")
+    networks = enabled_networks()
+    results = {}
+    futures = {}
+    pool = ThreadPoolExecutor(max_workers=max(1, len(networks)), thread_name_prefix="affiliate-poll")
+    for network in networks:
+        name = network.name
+        if not network.configured():
+            results[name] = {"network": name, "skipped": "missing credentials"}
+            continue
+        if not breaker_for(name).allow():
+            results[name] = {"network": name, "skipped": "circuit open"}
+            continue
+        with _running_lock:
+            if name in _running:
+                results[name] = {"network": name, "skipped": "previous poll still running"}
+                continue
+            _running.add(name)
+        futures[name] = pool.submit(_run, flask_app, network)
+    # don't block on stragglers: a timed-out poll keeps running in its thread and is
+    # skipped by later polls until it finishes
+    pool.shutdown(wait=False)
+
+    started = time.monotonic()
+    default_timeout = float(poller_settings()["timeout_seconds"])
+    for name, future in futures.items():
+        timeout = float((settings.get(name) or {}).get("timeout_seconds", default_timeout))
+        try:
+            results[name] = future.result(timeout=max(0.0, timeout - (time.monotonic() - started)))
+            breaker_for(name).record_success()
+        except FutureTimeout:
+            breaker_for(name).record_failure()
+            instrumentation.JOB_ERRORS.inc(job=f"affiliate_poll:{name}")
+            results[name] = {"network": name, "error": f"timed out after {timeout:.0f}s"}
+        except Exception as e:
+            breaker_for(name).record_failure()
+            instrumentation.JOB_ERRORS.inc(job=f"affiliate_poll:{name}")
+            print(f"Error polling {name}:")
+            traceback.print_exception(e)
+            results[name] = {"network": name, "error": str(e)}
+    return [results[n.name] for n in networks if n.name in results]
+
+
+def breaker_states():
+    return {name: {"state": b.state, "failures": b.failures} for name, b in _breakers.items()}
@@ -1,27 +1,58 @@
-import requests
 import os
-from datetime import datetime, timedelta
+from datetime import datetime
 
-RAKUTEN_API_URL = "https://api.rakutenmarketing.com/events/1.0/transactions"
+import http_client
+from affiliates.base import AffiliateNetwork, REGISTRY, parse_utc, register
+
+RAKUTEN_API_URL = os.getenv("RAKUTEN_API_URL", "https://api.rakutenmarketing.com/events/1.0/transactions")
 RAKUTEN_API_TOKEN = os.getenv("RAKUTEN_API_TOKEN")
+PAGE_LIMIT = 1000  # Events API maximum page size
+
+@register
+class Rakuten(AffiliateNetwork):
+    name = "rakuten"
+
+    def configured(self):
+        return bool(RAKUTEN_API_TOKEN)
+
+    def iter_transactions(self, since: datetime, until: datetime):
+        """Yield transactions processed in [since, until), following the Events API pages."""
+        headers = {"Authorization": f"Bearer {RAKUTEN_API_TOKEN}"}
+        page = 1
+        while True:
+            params = {
+                "process_date_start": since.strftime("%Y-%m-%d %H:%M:%S"),
+                "process_date_end": until.strftime("%Y-%m-%d %H:%M:%S"),
+                "limit": PAGE_LIMIT,
+                "page": page,
+            }
+            print("[poll_rakuten] checking approvals since", params["process_date_start"], "page", page)
+            resp = http_client.get(RAKUTEN_API_URL, headers=headers, params=params, timeout=30)
+            if resp.status_code != 200:
+                raise RuntimeError(f"Rakuten API error {resp.status_code}: {resp.text[:500]}")
+            rows = resp.json()
+            yield from rows
+            if len(rows) < PAGE_LIMIT:
+                return
+            page += 1
+
+    def transaction_id(self, tx):
+        return str(tx["etransaction_id"])
+
+    def transaction_time(self, tx):
+        return parse_utc(tx.get("process_date") or tx.get("transaction_date"))
+
+    def to_offer(self, tx):
+        link = tx.get("product_url") or tx.get("click_url")
+        if not link:
+            return None
+        return {"link": link, "product": tx.get("product_name")}
 
 def poll_rakuten_approvals(_=None):
-    if not RAKUTEN_API_TOKEN:
+    """Ingest Rakuten transactions newer than the stored high-water mark."""
+    network = REGISTRY["rakuten"]
+    if not network.configured():
         print("[poll_rakuten] missing credentials")
-        return []
-
-    since = (datetime.utcnow() - timedelta(days=2)).strftime("%Y-%m-%d")
-    headers = {"Authorization": f"Bearer {RAKUTEN_API_TOKEN}"}
-    params = {
-        "start_date": since,
-        "end_date": datetime.utcnow().strftime("%Y-%m-%d"),
-        "status": "approved",
-    }
-
-    print("[poll_rakuten] checking approvals since", since)
-    resp = requests.get(RAKUTEN_API_URL, headers=headers, params=params)
-    if resp.status_code != 200:
-        print("[poll_rakuten] API error:", resp.status_code, resp.text)
-        return []
-
-    return resp.json()
+        return {"network": network.name, "fetched": 0, "new": 0, "offers_added": 0}
+    from affiliates.ingest import ingest
+    return ingest(network)
@@ -1,16 +1,23 @@
-import os
+import csv
+import hmac
 import io
-import smtplib
+import os
+import re
+import socket
+import threading
+import time
 import traceback
-from datetime import datetime, timezone
-from email.mime.multipart import MIMEMultipart
-from email.mime.text import MIMEText
+import uuid
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import datetime, timedelta, timezone
 
-import requests
-from apscheduler.schedulers.background import BackgroundScheduler
+import click
+import sqlalchemy as sa
 from dotenv import load_dotenv
 from flask import (
     Flask,
+    current_app,
     flash,
     jsonify,
     redirect,
@@ -20,34 +27,46 @@ from flask import (
     url_for,
     send_file,
 )
-from flask_sqlalchemy import SQLAlchemy
 from itsdangerous import URLSafeTimedSerializer, BadTimeSignature, SignatureExpired
+from werkzeug.datastructures import MultiDict
 from werkzeug.utils import secure_filename
 
+import dedup
+import events
+import heartbeat
+import http_client
+import instrumentation
+import post_import
+import post_listing
+import send_schedule
+import media as media_store
+import renditions
+import timeseries
+from models import Analytics, MetricSample, Post, PostDelivery, PostLogEntry, db, ensure_schema
+from ratelimit import DEFAULT_BACKOFF_SECONDS, limiter
+from retry import MAX_ATTEMPTS as RETRY_MAX_ATTEMPTS, backoff_seconds, exception_result, is_transient
+
+# Importing this module only builds the Flask app (see create_app at the bottom).
+# Schema creation and the scheduler are started explicitly: `flask --app app init-db`,
+# the gunicorn hooks in gunicorn.conf.py, or `python app.py` for local development.
+# Heavy, rarely used dependencies (apscheduler, smtplib/email) are imported where used.
+
 # ---------------- ENV & APP SETUP ----------------
 load_dotenv()
 
-app = Flask(__name__, template_folder="templates", static_folder="static")
-app.secret_key = os.getenv("APP_SECRET_KEY", "supersecretkey")
-
-# DB config (auto switch postgres url format)
-db_url = os.getenv("DATABASE_URL", "sqlite:///local.db")
-if db_url.startswith("postgres://"):
-    db_url = db_url.replace("postgres://", "postgresql://")
-app.config["SQLALCHEMY_DATABASE_URI"] = db_url
-app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
-
-# Uploads (for images)
 UPLOAD_FOLDER = os.getenv("UPLOAD_FOLDER", "uploads")
-os.makedirs(UPLOAD_FOLDER, exist_ok=True)
-app.config["UPLOAD_FOLDER"] = UPLOAD_FOLDER
 ALLOWED_EXTENSIONS = {"png", "jpg", "jpeg", "gif", "mp4", "mov"}
-
-db = SQLAlchemy(app)
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_MB", 512)) * 1024 * 1024
+MEDIA_MAX_AGE = 365 * 24 * 3600  # content-addressed uploads never change
+MEDIA_WAIT_SECONDS = int(os.getenv("MEDIA_WAIT_SECONDS", 30))  # re-check delay for posts whose renditions aren't built yet
+MEDIA_MISSING_RETRY_SECONDS = int(os.getenv("MEDIA_MISSING_RETRY_SECONDS", 600))  # re-check delay when this process can't see the upload
+LOG_PAGE_SIZE = 50
+RUN_SCHEDULER = os.environ.get("RUN_SCHEDULER", "true").lower() == "true"
 
 # ---------------- ENV VARS ----------------
 PUBLER_API_KEY = os.getenv("PUBLER_API_KEY")
 PUBLER_WORKSPACE_ID = os.getenv("PUBLER_WORKSPACE_ID")
+PUBLER_API_URL = os.getenv("PUBLER_API_URL", "https://api.publer.io/v1")
 
 # Social tokens (you'll add these to .env)
 META_ACCESS_TOKEN = os.getenv("META_ACCESS_TOKEN")
@@ -72,67 +91,173 @@ ADMIN_USERNAME = os.getenv("ADMIN_USERNAME", "admin")
 ADMIN_PASSWORD = os.getenv("ADMIN_PASSWORD", "password")
 ADMIN_EMAIL = os.getenv("ADMIN_EMAIL", "")
 
-# ---------------- MODELS ----------------
-class Analytics(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    metric_name = db.Column(db.String(100))
-    metric_value = db.Column(db.String(255))
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
-
-
-class Post(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    title = db.Column(db.String(200))
-    body = db.Column(db.Text)
-    image_filename = db.Column(db.String(300), nullable=True)
-    platforms = db.Column(db.String(200))  # CSV: instagram,facebook,x,tiktok
-    scheduled_for = db.Column(db.DateTime, nullable=True)
-    status = db.Column(db.String(50), default="pending")  # pending, posted, failed
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    result_log = db.Column(db.Text, nullable=True)
-
-
-# ensure tables created at start (safe context)
-with app.app_context():
-    db.create_all()
-
+MANUAL_RUN_TOKEN = os.getenv("MANUAL_RUN_TOKEN")  # guards the cron-triggered /run/<token> endpoint
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")  # bearer token for Prometheus scrapes of /metrics (otherwise login required)
 
 # ---------------- HELPERS ----------------
 def allowed_file(filename):
     return "." in filename and filename.rsplit(".", 1)[1].lower() in ALLOWED_EXTENSIONS
 
 
-def append_log(post: Post, text: str):
-    now = datetime.now(timezone.utc).astimezone().isoformat()
-    post.result_log = (post.result_log or "") + f"\n[{now}] {text}"
-    db.session.add(post)
-    db.session.commit()
+def next_attempts(post_ids):
+    """Return {post_id: attempt number} for the next processing attempt of each post."""
+    if not post_ids:
+        return {}
+    rows = db.session.execute(
+        sa.select(PostLogEntry.post_id, sa.func.max(PostLogEntry.attempt))
+        .where(PostLogEntry.post_id.in_(post_ids))
+        .group_by(PostLogEntry.post_id)
+    ).all()
+    last = dict(rows)
+    return {pid: (last.get(pid) or 0) + 1 for pid in post_ids}
+
+
+class ResultLogBuffer:
+    """Collects log entries and status changes for a batch of posts and writes them in one go.
+
+    flush() issues one executemany INSERT into PostLogEntry, one executemany UPDATE for the
+    statuses and a single commit, so commits per scheduler tick stay constant no matter how
+    many posts and platforms were processed. Statuses are only written while the batch still
+    holds its claim (`token`): a post whose lease ran out and was claimed by another worker
+    is left to that worker.
+    """
+
+    _update_status = (
+        sa.update(Post.__table__)
+        .where(Post.__table__.c.id == sa.bindparam("b_id"), Post.__table__.c.claimed_by == sa.bindparam("b_token"))
+        .values(
+            status=sa.bindparam("b_status"),
+            scheduled_for=sa.func.coalesce(sa.bindparam("b_when", type_=sa.DateTime), Post.__table__.c.scheduled_for),
+            claimed_by=None,
+            lease_expires_at=None,
+        )
+    )
+
+    def __init__(self, token: str):
+        self.token = token
+        self.entries = []
+        self.statuses = {}
+
+    def log(self, post_id: int, text: str, platform: str | None = None, attempt: int = 1, ok: bool | None = None):
+        self.entries.append({
+            "post_id": post_id,
+            "platform": platform,
+            "attempt": attempt,
+            "ok": ok,
+            "message": text,
+            "created_at": datetime.utcnow(),
+        })
+
+    def set_status(self, post_id: int, status: str):
+        self.statuses[post_id] = (status, None)
+
+    def reschedule(self, post_id: int, when: datetime):
+        """Put the post back in the queue as pending, due at `when`."""
+        self.statuses[post_id] = ("pending", when)
+
+    def flush(self):
+        if not self.entries and not self.statuses:
+            return 0
+        if self.entries:
+            db.session.execute(sa.insert(PostLogEntry), self.entries)
+        if self.statuses:
+            result = db.session.execute(
+                self._update_status,
+                [{"b_id": pid, "b_token": self.token, "b_status": status, "b_when": when} for pid, (status, when) in self.statuses.items()],
+            )
+            if 0 <= result.rowcount < len(self.statuses):
+                print(f"Claim {self.token}: lease lost on {len(self.statuses) - result.rowcount} post(s); their status was left to the new owner")
+            events.publish_many([
+                events.event_row("post", {"id": pid, "status": status, "scheduled_for": when})
+                for pid, (status, when) in self.statuses.items()
+            ])
+        with instrumentation.DB_COMMIT.time(site="result_log"):
+            db.session.commit()
+        written = len(self.entries) + len(self.statuses)
+        self.entries.clear()
+        self.statuses.clear()
+        return written
 
 
 # ---------------- PLATFORM POSTING (STUBS) ----------------
 # These functions contain example flows. Replace / expand with real API calls for production.
 # They must return dict {"ok": True/False, "msg": "...", "meta": {...}}
-
-def post_to_facebook(text: str, image_path: str | None):
+# A rate-limited call returns {"ok": False, "deferred": True, "retry_after": seconds, ...}
+# so the post is re-scheduled instead of failed. Failures may carry "status" (HTTP code)
+# or "transient" so retry.is_transient() can tell retryable errors from permanent ones.
+
+# Base URLs can be pointed elsewhere (bench/mock_apis.py) through the environment.
+FB_GRAPH_URL = os.getenv("FB_GRAPH_URL", "https://graph.facebook.com")
+FB_GRAPH_VIDEO_URL = os.getenv("FB_GRAPH_VIDEO_URL", "https://graph-video.facebook.com")  # resumable video uploads
+
+
+def facebook_result(r, ok_msg: str):
+    backoff = limiter.observe("facebook", r)
+    if r.status_code in (200, 201):
+        return {"ok": True, "msg": ok_msg, "meta": r.json()}
+    if backoff:
+        return {"ok": False, "deferred": True, "retry_after": backoff, "msg": f"FB rate limited {r.status_code}, retry in {int(backoff)}s"}
+    return {"ok": False, "status": r.status_code, "msg": f"FB error {r.status_code} {r.text}"}
+
+
+def post_facebook_video(text: str, media: media_store.MediaFile):
+    """Chunked upload session: start, transfer the byte ranges Graph asks for, finish.
+
+    Only one chunk of the file is in memory at a time.
+    """
+    url = f"{FB_GRAPH_VIDEO_URL}/{META_PAGE_ID}/videos"
+    auth = {"access_token": META_ACCESS_TOKEN}
+    r = http_client.post(url, data={**auth, "upload_phase": "start", "file_size": media.size}, timeout=30)
+    res = facebook_result(r, "FB video upload started")
+    if not res["ok"]:
+        return res
+    session_id = res["meta"]["upload_session_id"]
+    start, end = int(res["meta"]["start_offset"]), int(res["meta"]["end_offset"])
+    with media.open() as fh:
+        while start < end:
+            fh.seek(start)
+            chunk = fh.read(end - start)
+            r = http_client.post(
+                url,
+                data={**auth, "upload_phase": "transfer", "upload_session_id": session_id, "start_offset": start},
+                files={"video_file_chunk": (media.filename, chunk, media.mimetype)},
+                timeout=(http_client.CONNECT_TIMEOUT, 120),
+            )
+            res = facebook_result(r, "FB video chunk uploaded")
+            if not res["ok"]:
+                return res
+            start, end = int(res["meta"]["start_offset"]), int(res["meta"]["end_offset"])
+    r = http_client.post(
+        url, data={**auth, "upload_phase": "finish", "upload_session_id": session_id, "description": text}, timeout=30
+    )
+    return facebook_result(r, "Posted video to Facebook")
+
+
+def post_to_facebook(text: str, media: media_store.MediaFile | None):
     try:
-        # Example: Post to Facebook Page using Graph API (page access token)
+        # Post to the Facebook Page using Graph API (page access token)
         if not META_ACCESS_TOKEN or not META_PAGE_ID:
             return {"ok": False, "msg": "Missing Facebook/META credentials"}
 
-        url = f"https://graph.facebook.com/{META_PAGE_ID}/feed"
-        payload = {"message": text, "access_token": META_ACCESS_TOKEN}
-        if image_path:
-            # Note: real media upload is multi-step. This is a simplified placeholder.
-            payload["message"] = text + "\n\n(Has image — upload logic skipped in stub)"
-        r = requests.post(url, data=payload, timeout=15)
-        if r.status_code in (200, 201):
-            return {"ok": True, "msg": "Posted to Facebook", "meta": r.json()}
-        return {"ok": False, "msg": f"FB error {r.status_code} {r.text}"}
+        if media is None:
+            payload = {"message": text, "access_token": META_ACCESS_TOKEN}
+            r = http_client.post(f"{FB_GRAPH_URL}/{META_PAGE_ID}/feed", data=payload, timeout=15)
+            return facebook_result(r, "Posted to Facebook")
+        if media.is_video:
+            return post_facebook_video(text, media)
+        with media.open() as fh:
+            r = http_client.post(
+                f"{FB_GRAPH_URL}/{META_PAGE_ID}/photos",
+                data={"caption": text, "access_token": META_ACCESS_TOKEN},
+                files={"source": (media.filename, fh, media.mimetype)},
+                timeout=(http_client.CONNECT_TIMEOUT, 60),
+            )
+        return facebook_result(r, "Posted photo to Facebook")
     except Exception as e:
-        return {"ok": False, "msg": f"Exception: {e}"}
+        return exception_result(e)
 
 
-def post_to_instagram(text: str, image_path: str | None):
+def post_to_instagram(text: str, media: media_store.MediaFile | None):
     try:
         # Instagram Graph API requires container creation, publishing. This stub mimics success/failure.
         if not INSTAGRAM_BUSINESS_ID or not META_ACCESS_TOKEN:
@@ -140,120 +265,516 @@ def post_to_instagram(text: str, image_path: str | None):
         # Stub: pretend we posted
         return {"ok": True, "msg": "Posted to Instagram (stub)", "meta": {}}
     except Exception as e:
-        return {"ok": False, "msg": f"Exception: {e}"}
+        return exception_result(e)
 
 
-def post_to_twitter(text: str, image_path: str | None):
+def post_to_twitter(text: str, media: media_store.MediaFile | None):
     try:
         if not TWITTER_BEARER_TOKEN:
             return {"ok": False, "msg": "Missing Twitter/X credentials"}
         # Stub: pretend we posted
         return {"ok": True, "msg": "Posted to X/Twitter (stub)", "meta": {}}
     except Exception as e:
-        return {"ok": False, "msg": f"Exception: {e}"}
+        return exception_result(e)
 
 
-def post_to_tiktok(text: str, image_path: str | None):
+def post_to_tiktok(text: str, media: media_store.MediaFile | None):
     try:
         if not TIKTOK_ACCESS_TOKEN:
             return {"ok": False, "msg": "Missing TikTok credentials"}
         # Stub: pretend we posted
         return {"ok": True, "msg": "Posted to TikTok (stub)", "meta": {}}
     except Exception as e:
-        return {"ok": False, "msg": f"Exception: {e}"}
+        return exception_result(e)
+
+
+# ---------------- PUBLISHING ENGINE ----------------
+# Every (post, platform) pair is sent concurrently. Each platform gets its own small
+# thread pool so in-flight requests are capped per platform and one slow API
+# cannot starve the others. Workers only do HTTP; all DB writes stay on the caller thread.
+PLATFORM_POSTERS = {
+    "facebook": post_to_facebook,
+    "instagram": post_to_instagram,
+    "x": post_to_twitter,
+    "twitter": post_to_twitter,
+    "tiktok": post_to_tiktok,
+}
+PLATFORM_ALIASES = post_import.PLATFORM_ALIASES
+PLATFORM_MAX_IN_FLIGHT = {
+    "facebook": int(os.getenv("FACEBOOK_MAX_IN_FLIGHT", 4)),
+    "instagram": int(os.getenv("INSTAGRAM_MAX_IN_FLIGHT", 4)),
+    "x": int(os.getenv("X_MAX_IN_FLIGHT", 4)),
+    "tiktok": int(os.getenv("TIKTOK_MAX_IN_FLIGHT", 2)),
+}
+
+
+def post_platforms(post: Post):
+    """The post's platforms, canonical and unique (older rows may hold "twitter" or repeats)."""
+    return post_import.split_platforms(post.platforms)
+
+
+def post_media(post: Post, platform: str):
+    """(MediaFile of the post's rendition for `platform` or None, error if the media can't go there)."""
+    if not post.image_filename:
+        return None, None
+    folder = current_app.config["UPLOAD_FOLDER"]
+    filename, error = renditions.rendition_for(folder, post.image_filename, PLATFORM_ALIASES.get(platform, platform))
+    if error:
+        return None, error
+    return media_store.MediaFile(os.path.join(folder, filename)), None
+
+
+def publish_to_platform(platform: str, text: str, media: media_store.MediaFile | None):
+    poster = PLATFORM_POSTERS.get(platform)
+    if poster is None:
+        return {"ok": False, "msg": f"Unknown platform: {platform}"}
+    try:
+        with instrumentation.PLATFORM_LATENCY.time(platform=platform):
+            res = poster(text, media)
+    except Exception as e:
+        res = exception_result(e, f"Exception while posting to {platform}: ")
+    instrumentation.PLATFORM_RESULTS.inc(platform=platform, outcome="ok" if res.get("ok") else "error")
+    return res
+
+
+def publish_posts(posts, platforms_for: dict | None = None, keep_alive=None):
+    """Publish every (post, platform) pair concurrently.
+
+    `platforms_for` maps post id -> platforms to send to (default: all of the post's platforms).
+    `keep_alive()` is called every LEASE_RENEW_SECONDS while sends are still running.
+    Returns {post_id: [(platform, result), ...]} with platforms in the order given.
+    """
+    if platforms_for is None:
+        platforms_for = {p.id: post_platforms(p) for p in posts}
+    results = {p.id: [] for p in posts}
+    jobs = []
+    for p in posts:
+        text = p.body or p.title or ""
+        for platform in platforms_for.get(p.id, []):
+            media, error = post_media(p, platform)
+            if error:
+                results[p.id].append((platform, {"ok": False, "msg": error}))
+            else:
+                jobs.append((p.id, platform, text, media))
+    if not jobs:
+        return results
+
+    # A post is sent to all of its platforms or, if any of them is out of tokens/quota,
+    # to none of them yet; it gets re-scheduled for when every platform has room.
+    allowed = {}
+    for p in posts:
+        platforms = platforms_for.get(p.id, [])
+        if not platforms:
+            continue
+        ok, retry_at = limiter.acquire(PLATFORM_ALIASES.get(pl, pl) for pl in platforms)
+        allowed[p.id] = ok
+        if not ok:
+            results[p.id] = [
+                (pl, {"ok": False, "deferred": True, "retry_at": retry_at, "msg": f"Rate limited, deferred to {retry_at.isoformat()}"})
+                for pl in platforms
+            ]
+
+    pools = {}
+    futures = []
+    try:
+        for post_id, platform, text, media in jobs:
+            if not allowed[post_id]:
+                continue
+            key = PLATFORM_ALIASES.get(platform, platform)
+            if key not in pools:
+                pools[key] = ThreadPoolExecutor(
+                    max_workers=max(1, PLATFORM_MAX_IN_FLIGHT.get(key, 1)),
+                    thread_name_prefix=f"publish-{key}",
+                )
+            futures.append((post_id, platform, pools[key].submit(publish_to_platform, platform, text, media)))
+
+        running = {fut for _, _, fut in futures}
+        while running:
+            _, running = wait(running, timeout=LEASE_RENEW_SECONDS)
+            if running and keep_alive:
+                keep_alive()
+        for post_id, platform, fut in futures:
+            try:
+                res = fut.result()
+            except Exception as e:
+                res = exception_result(e, f"Exception while posting to {platform}: ")
+            results[post_id].append((platform, res))
+    finally:
+        for pool in pools.values():
+            pool.shutdown(wait=True)
+    return results
+
+
+def retry_time(res: dict):
+    if res.get("retry_at"):
+        return res["retry_at"]
+    return datetime.utcnow() + timedelta(seconds=res.get("retry_after") or DEFAULT_BACKOFF_SECONDS)
+
+
+def sent_today_by_platform():
+    """Successful sends per platform since UTC midnight, across every worker."""
+    start = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    rows = db.session.execute(
+        sa.select(PostLogEntry.platform, sa.func.count())
+        .where(PostLogEntry.created_at >= start, PostLogEntry.ok.is_(True), PostLogEntry.platform.isnot(None))
+        .group_by(PostLogEntry.platform)
+    ).all()
+    counts = defaultdict(int)
+    for platform, n in rows:
+        counts[PLATFORM_ALIASES.get(platform, platform)] += n
+    return counts
+
+
+# ---------------- WORK QUEUE ----------------
+# Posts are claimed in bounded batches before publishing. A claim flips the rows to
+# 'processing' with a unique token and a lease, so any number of schedulers (one per
+# gunicorn worker, cron, a separate process) can drain the queue without publishing a
+# post twice. Postgres uses SELECT ... FOR UPDATE SKIP LOCKED; on SQLite the claim is a
+# single conditional UPDATE, which SQLite serializes. Rows whose lease runs out (the
+# claiming worker died) become claimable again.
+CLAIM_BATCH_SIZE = int(os.getenv("CLAIM_BATCH_SIZE", 50))
+CLAIM_LEASE_SECONDS = int(os.getenv("CLAIM_LEASE_SECONDS", 300))
+LEASE_RENEW_SECONDS = CLAIM_LEASE_SECONDS / 3  # a batch still publishing after this long extends its lease
+PUBLISH_TICK_BUDGET_SECONDS = float(os.getenv("PUBLISH_TICK_BUDGET_SECONDS", 12))
+
+
+def claimable_filter(now: datetime):
+    return sa.or_(
+        sa.and_(
+            Post.status == "pending",
+            sa.or_(Post.scheduled_for.is_(None), Post.scheduled_for <= now),
+        ),
+        sa.and_(Post.status == "processing", Post.lease_expires_at < now),
+    )
+
+
+def claim_due_posts(limit: int = CLAIM_BATCH_SIZE, lease_seconds: int = CLAIM_LEASE_SECONDS):
+    """Atomically claim up to `limit` due posts for this worker and return them."""
+    with instrumentation.DB_QUERY.time(query="claim_due_posts"):
+        return _claim_due_posts(limit, lease_seconds)
+
+
+def _claim_due_posts(limit: int, lease_seconds: int):
+    now = datetime.utcnow()
+    token = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:12]}"
+    due = claimable_filter(now)
+    ids_query = (
+        sa.select(Post.id)
+        .where(due)
+        .order_by(Post.scheduled_for.asc().nullsfirst(), Post.id)
+        .limit(limit)
+    )
+    if db.engine.dialect.name == "postgresql":
+        ids = db.session.scalars(ids_query.with_for_update(skip_locked=True)).all()
+        if not ids:
+            db.session.rollback()
+            return []
+        target = Post.id.in_(ids)
+    else:
+        target = sa.and_(Post.id.in_(ids_query.scalar_subquery()), due)
+
+    db.session.execute(
+        sa.update(Post)
+        .where(target)
+        .values(status="processing", claimed_by=token, lease_expires_at=now + timedelta(seconds=lease_seconds))
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+    return Post.query.filter(Post.claimed_by == token).order_by(Post.scheduled_for.asc().nullsfirst(), Post.id).all()
+
+
+def renew_lease(token: str, lease_seconds: int = CLAIM_LEASE_SECONDS):
+    """Push back the lease of every post still held by claim `token` (commits)."""
+    with instrumentation.DB_QUERY.time(query="renew_lease"):
+        db.session.execute(
+            sa.update(Post)
+            .where(Post.claimed_by == token, Post.status == "processing")
+            .values(lease_expires_at=datetime.utcnow() + timedelta(seconds=lease_seconds))
+            .execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+
+
+# ---------------- DELIVERIES ----------------
+def load_deliveries(posts):
+    """Return {post_id: {platform: PostDelivery}}, creating rows for platforms seen for the first time."""
+    with instrumentation.DB_QUERY.time(query="load_deliveries"):
+        return _load_deliveries(posts)
+
+
+def _load_deliveries(posts):
+    post_ids = [p.id for p in posts]
+    existing = defaultdict(dict)
+    for d in PostDelivery.query.filter(PostDelivery.post_id.in_(post_ids)):
+        existing[d.post_id][PLATFORM_ALIASES.get(d.platform, d.platform)] = d
+    missing = [
+        {"post_id": p.id, "platform": platform, "status": "pending", "attempts": 0}
+        for p in posts
+        for platform in post_platforms(p)
+        if platform not in existing[p.id]
+    ]
+    if missing:
+        db.session.execute(sa.insert(PostDelivery), missing)
+        for d in PostDelivery.query.filter(PostDelivery.post_id.in_({m["post_id"] for m in missing})):
+            existing[d.post_id].setdefault(PLATFORM_ALIASES.get(d.platform, d.platform), d)
+    return existing
+
+
+def record_delivery(d: PostDelivery, res: dict, now: datetime):
+    """Apply one publish result to a delivery row (posted, scheduled for retry, or failed)."""
+    d.updated_at = now
+    if res.get("ok"):
+        d.attempts += 1
+        d.status = "posted"
+        d.next_attempt_at = None
+        d.last_error = None
+        return
+    d.last_error = res.get("msg")
+    if res.get("deferred"):
+        # rate limited: not the platform's fault, does not use up an attempt
+        d.status = "retrying" if d.attempts else "pending"
+        d.next_attempt_at = retry_time(res)
+        return
+    d.attempts += 1
+    if is_transient(res) and d.attempts < RETRY_MAX_ATTEMPTS:
+        d.status = "retrying"
+        d.next_attempt_at = now + timedelta(seconds=backoff_seconds(d.attempts))
+    else:
+        d.status = "failed"
+        d.next_attempt_at = None
 
 
 # ---------------- SCHEDULER JOBS ----------------
+def process_claimed_posts(candidates):
+    now = datetime.utcnow()
+    token = candidates[0].claimed_by
+    log = ResultLogBuffer(token)
+    attempts = next_attempts([p.id for p in candidates])
+    deliveries = load_deliveries(candidates)
+    to_send = {
+        p.id: [
+            platform for platform in post_platforms(p)
+            if deliveries[p.id][platform].status in ("pending", "retrying")
+            and (deliveries[p.id][platform].next_attempt_at is None or deliveries[p.id][platform].next_attempt_at <= now)
+        ]
+        for p in candidates
+    }
+    # media renditions are built by the process pool in renditions.py; never inline here
+    folder = current_app.config["UPLOAD_FOLDER"]
+    media_missing = {
+        p.id for p in candidates if p.image_filename and not os.path.exists(os.path.join(folder, p.image_filename))
+    }
+    media_wait = {p.id for p in candidates if p.image_filename and not renditions.is_ready(folder, p.image_filename)}
+    for p in candidates:
+        if p.id in media_missing:
+            # Uploads live on the web service's disk: a worker without that storage must not
+            # burn the post as a permanent failure. Defer it and say so everywhere we can.
+            instrumentation.MEDIA_MISSING.inc()
+            print(f"Post {p.id}: media {p.image_filename!r} not found in {os.path.abspath(folder)}; is UPLOAD_FOLDER shared with the web service?")
+            log.log(p.id, f"Media file {p.image_filename} not available to this worker; retrying later", attempt=attempts[p.id], ok=False)
+            log.reschedule(p.id, now + timedelta(seconds=MEDIA_MISSING_RETRY_SECONDS))
+            to_send[p.id] = []
+            continue
+        if p.id in media_wait:
+            renditions.submit(folder, p.image_filename)
+            log.log(p.id, "Waiting for media renditions", attempt=attempts[p.id])
+            log.reschedule(p.id, now + timedelta(seconds=MEDIA_WAIT_SECONDS))
+            to_send[p.id] = []
+            continue
+        log.log(p.id, f"Processing post id={p.id} platforms={','.join(to_send[p.id])}", attempt=attempts[p.id])
+
+    results = publish_posts(candidates, to_send, keep_alive=lambda: renew_lease(token))
+
+    now = datetime.utcnow()
+    for p in candidates:
+        if p.id in media_wait or p.id in media_missing:
+            continue
+        for platform, res in results.get(p.id, []):
+            log.log(p.id, res.get("msg"), platform=platform, attempt=attempts[p.id], ok=bool(res.get("ok")))
+            record_delivery(deliveries[p.id][platform], res, now)
+
+        states = [deliveries[p.id][platform] for platform in post_platforms(p)]
+        waiting = [d for d in states if d.status in ("pending", "retrying")]
+        if waiting:
+            log.reschedule(p.id, min(d.next_attempt_at or now for d in waiting))
+        elif all(d.status == "posted" for d in states):
+            log.set_status(p.id, "posted")
+        else:
+            log.set_status(p.id, "failed")
+
+    log.flush()
+
+
+def plan_send_times():
+    """Spread unscheduled pending posts over the day's quota (send_schedule.plan)."""
+    with instrumentation.DB_QUERY.time(query="plan_send_times"):
+        return send_schedule.plan(
+            limiter.default_per_day or 0,
+            limiter.per_day,
+            lambda platform: PLATFORM_ALIASES.get(platform.strip().lower(), platform.strip().lower()),
+        )
+
+
 def process_pending_posts():
-    """Find posts with status 'pending' and scheduled_for <= now (or immediate), and publish them."""
+    """Claim due posts in batches and publish them until the queue is empty or the tick budget is spent."""
     try:
-        now = datetime.utcnow()
-        candidates = Post.query.filter(
-            Post.status == "pending",
-            (Post.scheduled_for == None) | (Post.scheduled_for <= now),
-        ).order_by(Post.scheduled_for.asc().nullsfirst()).all()
-
-        for p in candidates:
-            append_log(p, f"Processing post id={p.id} platforms={p.platforms}")
-            platforms = [s.strip().lower() for s in (p.platforms or "").split(",") if s.strip()]
-
-            overall_ok = True
-            for platform in platforms:
-                try:
-                    if platform == "facebook":
-                        res = post_to_facebook(p.body or p.title or "", os.path.join(app.config["UPLOAD_FOLDER"], p.image_filename) if p.image_filename else None)
-                    elif platform == "instagram":
-                        res = post_to_instagram(p.body or p.title or "", os.path.join(app.config["UPLOAD_FOLDER"], p.image_filename) if p.image_filename else None)
-                    elif platform in ("x", "twitter"):
-                        res = post_to_twitter(p.body or p.title or "", os.path.join(app.config["UPLOAD_FOLDER"], p.image_filename) if p.image_filename else None)
-                    elif platform == "tiktok":
-                        res = post_to_tiktok(p.body or p.title or "", os.path.join(app.config["UPLOAD_FOLDER"], p.image_filename) if p.image_filename else None)
-                    else:
-                        res = {"ok": False, "msg": f"Unknown platform: {platform}"}
-                except Exception as e:
-                    res = {"ok": False, "msg": f"Exception while posting to {platform}: {e}"}
-
-                append_log(p, f"platform={platform} -> {res.get('msg')}")
-                if not res.get("ok"):
-                    overall_ok = False
-
-            p.status = "posted" if overall_ok else "failed"
-            db.session.add(p)
-            db.session.commit()
+        with instrumentation.JOB_DURATION.time(job="publish_tick"):
+            deadline = time.monotonic() + PUBLISH_TICK_BUDGET_SECONDS
+            plan_send_times()
+            with instrumentation.DB_QUERY.time(query="sent_today_by_platform"):
+                limiter.sync_daily(sent_today_by_platform())
+            while True:
+                candidates = claim_due_posts()
+                if not candidates:
+                    break
+                process_claimed_posts(candidates)
+                if time.monotonic() >= deadline:
+                    if len(candidates) == CLAIM_BATCH_SIZE:
+                        instrumentation.TICK_OVERRUNS.inc()
+                    break
     except Exception:
+        db.session.rollback()
+        instrumentation.JOB_ERRORS.inc(job="process_pending_posts")
         print("Error in process_pending_posts:")
         traceback.print_exc()
 
 
+def record_metric(name: str, value: str):
+    """Store one Analytics row and announce it to live dashboards."""
+    now = datetime.utcnow()
+    db.session.add(Analytics(metric_name=name, metric_value=value, created_at=now))
+    timeseries.record(name, value, now)
+    events.publish("analytics", {"metric": name, "value": value, "created": now.isoformat()})
+    db.session.commit()
+    analytics_cache.invalidate()
+
+
 def fetch_basic_analytics():
     """Example analytics job — pull follower counts or post counts and save to Analytics."""
     try:
         # Example Publer stats (if available)
         if PUBLER_API_KEY and PUBLER_WORKSPACE_ID:
             headers = {"Authorization": f"Bearer {PUBLER_API_KEY}"}
-            url = f"https://api.publer.io/v1/workspaces/{PUBLER_WORKSPACE_ID}/posts"
+            url = f"{PUBLER_API_URL}/workspaces/{PUBLER_WORKSPACE_ID}/posts"
             try:
-                r = requests.get(url, headers=headers, timeout=10)
+                r = http_client.get(url, headers=headers, timeout=10)
                 json_data = r.json()
                 count = len(json_data.get("data", []))
-                db.session.add(Analytics(metric_name="Publer posts", metric_value=str(count)))
-                db.session.commit()
+                record_metric("Publer posts", str(count))
             except Exception:
                 append_generic = False
         # Also example other platform follower fetch stubs
         # Instagram followers stub:
         if INSTAGRAM_BUSINESS_ID and META_ACCESS_TOKEN:
             # Real fetch requires Graph API calls — stubbed
-            db.session.add(Analytics(metric_name="IG followers (stub)", metric_value="n/a"))
-            db.session.commit()
+            record_metric("IG followers (stub)", "n/a")
 
     except Exception:
+        instrumentation.JOB_ERRORS.inc(job="fetch_analytics")
         print("Error in fetch_basic_analytics:")
         traceback.print_exc()
 
 
-# Start APScheduler, but guard to avoid double start under multiple gunicorn workers.
-scheduler = BackgroundScheduler(timezone="UTC")
-if os.environ.get("RUN_SCHEDULER", "true").lower() == "true":
+def rollup_metrics():
+    """Fold new metric samples into the hourly/daily rollups behind /api/analytics/series."""
+    try:
+        with instrumentation.JOB_DURATION.time(job="rollup_metrics"):
+            timeseries.rollup()
+    except Exception:
+        db.session.rollback()
+        instrumentation.JOB_ERRORS.inc(job="rollup_metrics")
+        print("Error in rollup_metrics:")
+        traceback.print_exc()
+
+
+def poll_affiliates():
+    """Incrementally ingest approved transactions from every enabled affiliate network, in parallel."""
+    from affiliates.poller import poll_all
+
+    return poll_all(current_app._get_current_object())
+
+
+def dispatch_due_posts():
+    process_pending_posts()
+    return send_schedule.upcoming()
+
+
+def wake_dispatcher():
+    """Run the publisher now if this process hosts it (new posts may be due immediately)."""
+    dispatcher = current_app.extensions.get("dispatcher")
+    if dispatcher is not None:
+        dispatcher.wake()
+
+
+SCHEDULER_JOB_THREADS = int(os.getenv("SCHEDULER_JOB_THREADS", 4))
+AFFILIATE_POLL_MINUTES = int(os.getenv("AFFILIATE_POLL_MINUTES", 60))
+
+
+def start_scheduler(flask_app):
+    """Start the publishing dispatcher and the BackgroundScheduler for this process; jobs run inside an app context.
+
+    Meant for the dedicated worker (auto_scheduler.py); web workers leave RUN_SCHEDULER off.
+    """
+    from apscheduler.executors.pool import ThreadPoolExecutor as JobThreadPool
+    from apscheduler.schedulers.background import BackgroundScheduler
+
+    dispatcher = send_schedule.Dispatcher(flask_app, dispatch_due_posts).start()
+    flask_app.extensions["dispatcher"] = dispatcher
+
+    def in_app_context(job):
+        def run():
+            with flask_app.app_context():
+                job()
+        run.__name__ = job.__name__
+        return run
+
+    def leader_only(job):
+        # once per deployment, not once per worker process
+        def run():
+            if heartbeat.is_leader():
+                job()
+        run.__name__ = job.__name__
+        return run
+
+    def send_heartbeat():
+        try:
+            heartbeat.beat("scheduler", {
+                "jobs": [job.id for job in scheduler.get_jobs()],
+                "next_due": dispatcher.next_due(),
+                "dispatcher_alive": dispatcher.thread.is_alive(),
+                "metrics": instrumentation.snapshot(),
+            })
+        except Exception:
+            db.session.rollback()
+            instrumentation.JOB_ERRORS.inc(job="heartbeat")
+            print("Error sending heartbeat:")
+            traceback.print_exc()
+
+    scheduler = BackgroundScheduler(
+        timezone="UTC",
+        executors={"default": JobThreadPool(SCHEDULER_JOB_THREADS)},
+        job_defaults={"coalesce": True, "max_instances": 1},
+    )
     try:
-        # Add jobs if not already present
-        if not any(job.id == "process_posts" for job in scheduler.get_jobs()):
-            scheduler.add_job(process_pending_posts, "interval", seconds=15, id="process_posts", max_instances=1)
-        if not any(job.id == "fetch_analytics" for job in scheduler.get_jobs()):
-            scheduler.add_job(fetch_basic_analytics, "interval", minutes=15, id="fetch_analytics", max_instances=1)
-        # Start only if not running
-        if not scheduler.running:
-            scheduler.start()
+        scheduler.add_job(in_app_context(send_heartbeat), "interval", seconds=heartbeat.INTERVAL_SECONDS, id="heartbeat", next_run_time=datetime.now(timezone.utc))
+        scheduler.add_job(in_app_context(leader_only(fetch_basic_analytics)), "interval", minutes=15, id="fetch_analytics")
+        scheduler.add_job(in_app_context(leader_only(rollup_metrics)), "interval", minutes=5, id="rollup_metrics")
+        scheduler.add_job(in_app_context(leader_only(poll_affiliates)), "interval", minutes=AFFILIATE_POLL_MINUTES, id="poll_affiliates")
+        scheduler.start()
     except Exception:
-        # If scheduler can't start (e.g. at import time under weird env), print but continue.
-        print("Warning: could not start scheduler (maybe already running in worker).")
+        print("Warning: could not start scheduler.")
         traceback.print_exc()
+    return scheduler
 
 
 # ---------------- EMAIL RESET ----------------
 def send_reset_email(user_email):
+    import smtplib
+    from email.mime.multipart import MIMEMultipart
+    from email.mime.text import MIMEText
+
     try:
-        s = URLSafeTimedSerializer(app.secret_key)
+        s = URLSafeTimedSerializer(current_app.secret_key)
         token = s.dumps(user_email, salt="password-reset-salt")
         reset_link = f"{request.url_root}reset_password/{token}"
 
@@ -282,8 +803,133 @@ def send_reset_email(user_email):
         return {"ok": False, "msg": f"Error sending email: {exc}"}
 
 
+# ---------------- ANALYTICS CACHE ----------------
+ANALYTICS_FEED_SIZE = 20
+ANALYTICS_CACHE_TTL = float(os.getenv("ANALYTICS_CACHE_TTL", 5))
+
+
+class AnalyticsCache:
+    """Latest Analytics rows for /api/analytics, shared by every request in this process.
+
+    Writes in this process call invalidate(); writes from other processes (another worker,
+    the scheduler worker) are picked up by re-checking MAX(id) at most every `ttl` seconds.
+    The feed is only re-queried when that version changes.
+    """
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.version = None
+        self.items = []
+        self.last_modified = None
+        self.checked_at = 0.0
+
+    def invalidate(self):
+        with self.lock:
+            self.checked_at = 0.0
+
+    def get(self):
+        with self.lock:
+            if time.monotonic() - self.checked_at < self.ttl:
+                return self.version, self.items, self.last_modified
+            version = db.session.scalar(sa.select(sa.func.max(Analytics.id))) or 0
+            if version != self.version:
+                rows = db.session.execute(
+                    sa.select(Analytics.metric_name, Analytics.metric_value, Analytics.created_at)
+                    .order_by(Analytics.created_at.desc())
+                    .limit(ANALYTICS_FEED_SIZE)
+                ).all()
+                self.items = [
+                    {"metric": name, "value": value, "created": created.isoformat(), "_created": created}
+                    for name, value, created in rows
+                ]
+                self.last_modified = rows[0].created_at if rows else None
+                self.version = version
+            self.checked_at = time.monotonic()
+            return self.version, self.items, self.last_modified
+
+
+analytics_cache = AnalyticsCache(ANALYTICS_CACHE_TTL)
+
+
+# ---------------- METRICS ----------------
+# Timings live in each process's instrumentation registry. The background worker ships
+# its registry with every heartbeat, so a scrape of any web worker sees the publisher's
+# numbers too; queue gauges are read from the database, at most every METRICS_CACHE_TTL
+# seconds per process however many dashboards poll /api/metrics.
+METRICS_CACHE_TTL = float(os.getenv("METRICS_CACHE_TTL", 10))
+
+
+class GaugeCache:
+    """Last queue_gauges() result, shared by every request in this process for `ttl` seconds."""
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.value = None
+        self.checked_at = 0.0
+
+    def get(self):
+        with self.lock:
+            if self.value is None or time.monotonic() - self.checked_at >= self.ttl:
+                self.value = queue_gauges()
+                self.checked_at = time.monotonic()
+            return self.value
+
+
+def queue_gauges(now: datetime | None = None):
+    now = now or datetime.utcnow()
+    counts = dict(db.session.execute(sa.select(Post.status, sa.func.count()).group_by(Post.status)).all())
+    due, oldest_due = db.session.execute(
+        sa.select(sa.func.count(), sa.func.min(Post.scheduled_for))
+        .where(Post.status == "pending", Post.scheduled_for <= now)
+    ).one()
+    unplanned = db.session.scalar(
+        sa.select(sa.func.count()).where(Post.status == "pending", Post.scheduled_for.is_(None))
+    )
+    return {
+        "pending": counts.get("pending", 0),
+        "processing": counts.get("processing", 0),
+        "failed": counts.get("failed", 0),
+        "due": due,
+        "unplanned": unplanned,
+        "lag_seconds": round((now - oldest_due).total_seconds(), 3) if oldest_due else 0.0,
+    }
+
+
+gauge_cache = GaugeCache(METRICS_CACHE_TTL)
+
+
+def metric_snapshots():
+    """{worker id: instrumentation snapshot} for this process and every alive background worker."""
+    snapshots = {heartbeat.worker_id(): instrumentation.snapshot()}
+    for worker in heartbeat.status():
+        if worker["alive"] and worker["info"].get("metrics") and worker["worker_id"] not in snapshots:
+            snapshots[worker["worker_id"]] = worker["info"]["metrics"]
+    return snapshots
+
+
+def metrics_authorized():
+    if METRICS_TOKEN:
+        supplied = request.headers.get("Authorization", "").removeprefix("Bearer ").strip() or request.args.get("token", "")
+        if supplied and hmac.compare_digest(supplied, METRICS_TOKEN):
+            return True
+    return "user" in session
+
+
 # ---------------- ROUTES ----------------
-@app.route("/", methods=["GET", "POST"])
+# Views are collected here and registered on the app in create_app().
+ROUTES = []
+
+
+def route(rule, **options):
+    def decorator(view):
+        ROUTES.append((rule, view, options))
+        return view
+    return decorator
+
+
+@route("/", methods=["GET", "POST"])
 def login():
     if request.method == "POST":
         user = request.form.get("username", "")
@@ -298,32 +944,38 @@ def login():
     return render_template("login.html")
 
 
-@app.route("/logout")
+@route("/logout")
 def logout():
     session.pop("user", None)
     flash("Logged out.", "info")
     return redirect(url_for("login"))
 
 
-@app.route("/dashboard")
+@route("/dashboard")
 def dashboard():
     if "user" not in session:
         return redirect(url_for("login"))
     # initial rendering of dashboard (analytics table will be updated by JS auto-refresh)
     analytics = Analytics.query.order_by(Analytics.created_at.desc()).limit(10).all()
-    posts = Post.query.order_by(Post.created_at.desc()).limit(10).all()
+    posts = post_listing.latest(10)
     return render_template("dashboard.html", analytics=analytics, posts=posts)
 
 
-@app.route("/upload/<filename>")
+@route("/upload/<filename>")
 def upload_file(filename):
-    path = os.path.join(app.config["UPLOAD_FOLDER"], filename)
-    if not os.path.exists(path):
+    # send_file(conditional=True) answers If-None-Match/If-Modified-Since with 304 and Range with 206
+    path = os.path.join(current_app.config["UPLOAD_FOLDER"], secure_filename(filename))
+    if not os.path.isfile(path):
         return ("Not found", 404)
-    return send_file(path)
+    if media_store.is_content_addressed(filename):
+        resp = send_file(path, conditional=True, etag=filename.split(".", 1)[0], max_age=MEDIA_MAX_AGE)
+        resp.cache_control.public = True
+        resp.cache_control.immutable = True
+        return resp
+    return send_file(path, conditional=True)
 
 
-@app.route("/create_post", methods=["GET", "POST"])
+@route("/create_post", methods=["GET", "POST"])
 def create_post():
     if "user" not in session:
         return redirect(url_for("login"))
@@ -340,48 +992,323 @@ def create_post():
             except Exception:
                 scheduled_for = None
 
+        fingerprint = dedup.Fingerprint(body or "")
+        duplicates = dedup.find_duplicates(fingerprint)
+        if duplicates and dedup.settings()["action"] == "skip" and not request.form.get("allow_duplicate"):
+            return render_template("create_post.html", duplicates=duplicates, form=request.form)
+
         image = request.files.get("image")
         filename = None
         if image and image.filename and allowed_file(image.filename):
-            filename = f"{int(datetime.utcnow().timestamp())}_{secure_filename(image.filename)}"
-            path = os.path.join(app.config["UPLOAD_FOLDER"], filename)
-            image.save(path)
+            filename = media_store.store_upload(image.stream, image.filename, current_app.config["UPLOAD_FOLDER"])
+            renditions.submit(current_app.config["UPLOAD_FOLDER"], filename)
 
         p = Post(
             title=title,
             body=body,
             image_filename=filename,
-            platforms=",".join(platforms),
+            platforms=",".join(post_import.split_platforms(platforms)),
             scheduled_for=scheduled_for,
             status="pending",
+            **fingerprint.columns(),
         )
         db.session.add(p)
+        db.session.flush()
+        dedup.index([(p.id, fingerprint, p.created_at)])
         db.session.commit()
-        flash("Post created and queued.", "success")
+        wake_dispatcher()
+        if duplicates:
+            flash(f"Post queued, but it resembles post #{duplicates[0]['post_id']} ({duplicates[0]['kind']} match).", "warning")
+        else:
+            flash("Post created and queued.", "success")
         return redirect(url_for("dashboard"))
 
-    return render_template("create_post.html")
+    return render_template("create_post.html", duplicates=[], form=MultiDict())
+
+
+@route("/api/posts/bulk", methods=["POST"])
+def api_posts_bulk():
+    """Queue many posts at once: a JSON list (or {"posts": [...]}) or a text/csv body in posts.csv format."""
+    if "user" not in session:
+        return jsonify({"error": "unauthorized"}), 401
+    if request.mimetype == "text/csv":
+        stream = io.TextIOWrapper(request.stream, encoding="utf-8-sig", newline="")
+        rows = csv.DictReader(stream)
+    else:
+        payload = request.get_json(silent=True)
+        rows = payload.get("posts") if isinstance(payload, dict) else payload
+        if not isinstance(rows, list):
+            return jsonify({"error": "expected a JSON list of posts, {\"posts\": [...]}, or a text/csv body"}), 400
+    summary = post_import.import_rows(rows, set(PLATFORM_POSTERS))
+    wake_dispatcher()
+    return jsonify(summary)
+
+
+def listing_page():
+    """(filters, rows, cursors) for /posts and /api/posts from the request's query args."""
+    filters = post_listing.Filters.from_args(request.args)
+    rows, cursors = post_listing.page(
+        filters,
+        after=request.args.get("after"),
+        before=request.args.get("before"),
+        limit=request.args.get("limit", post_listing.PAGE_SIZE, type=int),
+    )
+    return filters, rows, cursors
+
+
+@route("/posts")
+def list_posts():
+    if "user" not in session:
+        return redirect(url_for("login"))
+    try:
+        filters, rows, cursors = listing_page()
+    except ValueError as e:
+        flash(str(e), "danger")
+        return redirect(url_for("list_posts"))
+    return render_template("posts.html", posts=rows, filters=filters, cursors=cursors, statuses=post_listing.STATUSES)
+
+
+@route("/api/posts")
+def api_posts():
+    # ?status=&platform=&from=&to=&limit=&after=<cursor> (older) / &before=<cursor> (newer)
+    if "user" not in session:
+        return jsonify({"error": "unauthorized"}), 401
+    try:
+        filters, rows, cursors = listing_page()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({"posts": [post_listing.as_dict(r) for r in rows], "older": cursors["older"], "newer": cursors["newer"]})
 
 
-@app.route("/posts/<int:post_id>")
+@route("/posts/<int:post_id>")
 def view_post(post_id):
     if "user" not in session:
         return redirect(url_for("login"))
-    p = Post.query.get_or_404(post_id)
-    return render_template("view_post.html", post=p)
+    p = db.get_or_404(Post, post_id, options=[sa.orm.defer(Post.result_log)])
+    log_page = db.paginate(
+        sa.select(PostLogEntry).where(PostLogEntry.post_id == p.id).order_by(PostLogEntry.id.desc()),
+        page=request.args.get("page", 1, type=int),
+        per_page=LOG_PAGE_SIZE,
+        error_out=False,
+    )
+    deliveries = PostDelivery.query.filter_by(post_id=p.id).order_by(PostDelivery.platform).all()
+    thumbnail = renditions.thumbnail_for(current_app.config["UPLOAD_FOLDER"], p.image_filename) if p.image_filename else None
+    return render_template("view_post.html", post=p, log_page=log_page, deliveries=deliveries, thumbnail=thumbnail)
+
+
+@route("/posts/<int:post_id>/retry", methods=["POST"])
+def retry_post(post_id):
+    """Re-queue only the platforms that failed; platforms already posted are left alone."""
+    if "user" not in session:
+        return redirect(url_for("login"))
+    p = db.get_or_404(Post, post_id, options=[sa.orm.defer(Post.result_log)])
+    failed = PostDelivery.query.filter_by(post_id=p.id, status="failed").all()
+    if not failed and p.status != "failed":
+        flash("Nothing to retry.", "info")
+        return redirect(url_for("view_post", post_id=p.id))
+    # conditional on the status: a post a worker is publishing right now must not get a new
+    # slot, or another worker could claim and send it a second time
+    requeued = db.session.execute(
+        sa.update(Post)
+        .where(Post.id == p.id, Post.status.in_(("failed", "pending")))
+        .values(status="pending", scheduled_for=None)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    if not requeued:
+        db.session.rollback()
+        flash("This post is being published right now; retry once it has finished.", "warning")
+        return redirect(url_for("view_post", post_id=p.id))
+    for d in failed:
+        d.status = "pending"
+        d.attempts = 0
+        d.next_attempt_at = None
+    events.publish("post", {"id": p.id, "status": "pending", "scheduled_for": None})
+    db.session.commit()
+    flash(f"Re-queued {len(failed)} failed platform(s).", "success")
+    return redirect(url_for("view_post", post_id=p.id))
 
 
-@app.route("/api/analytics")
+@route("/api/analytics")
 def api_analytics():
-    # returns JSON for auto-refresh every 3 seconds
-    data = Analytics.query.order_by(Analytics.created_at.desc()).limit(20).all()
-    return jsonify([
-        {"metric": a.metric_name, "value": a.metric_value, "created": a.created_at.isoformat()}
-        for a in data
-    ])
+    # polled by the dashboard; served from analytics_cache and answered with 304 when unchanged.
+    # ?since=<iso time> returns only rows newer than that.
+    version, items, last_modified = analytics_cache.get()
+    try:
+        since_dt = parse_utc_arg("since")
+    except ValueError:
+        return jsonify({"error": "since must be an ISO-8601 timestamp"}), 400
+    etag = f"analytics-{version}-{request.args.get('since') or ''}"
+    if request.if_none_match:
+        not_modified = request.if_none_match.contains_weak(etag)
+    else:
+        # If-Modified-Since only counts without If-None-Match; HTTP dates have whole seconds
+        ims = request.if_modified_since
+        not_modified = bool(ims and last_modified and last_modified.replace(microsecond=0, tzinfo=timezone.utc) <= ims)
+    if not_modified:
+        resp = current_app.response_class(status=304)
+    else:
+        if since_dt:
+            items = [it for it in items if it["_created"] > since_dt]
+        resp = jsonify([{k: v for k, v in it.items() if k != "_created"} for it in items])
+    resp.set_etag(etag, weak=True)
+    if last_modified:
+        resp.last_modified = last_modified.replace(tzinfo=timezone.utc)
+    resp.cache_control.no_cache = True
+    return resp
+
+
+def parse_utc_arg(name: str):
+    """Naive-UTC datetime from an ISO-8601 query arg, None if absent; ValueError if malformed."""
+    raw = request.args.get(name)
+    if not raw:
+        return None
+    ts = datetime.fromisoformat(raw.replace("Z", "+00:00"))
+    return ts.astimezone(timezone.utc).replace(tzinfo=None) if ts.tzinfo else ts
+
+
+@route("/api/analytics/series")
+def api_analytics_series():
+    # ?metric=<name>&from=<iso>&to=<iso>&step=hour|day|raw — chart data served from the rollups
+    if "user" not in session:
+        return jsonify({"error": "unauthorized"}), 401
+    metric = request.args.get("metric")
+    if not metric:
+        return jsonify({"error": "metric is required"}), 400
+    try:
+        end = parse_utc_arg("to") or datetime.utcnow()
+        start = parse_utc_arg("from") or end - timedelta(days=7)
+    except ValueError:
+        return jsonify({"error": "from/to must be ISO-8601 timestamps"}), 400
+    step = request.args.get("step") or timeseries.default_step(start, end)
+    if step not in timeseries.STEPS and step != "raw":
+        return jsonify({"error": "step must be hour, day or raw"}), 400
+    return jsonify({
+        "metric": metric,
+        "from": start.isoformat(),
+        "to": end.isoformat(),
+        "step": step,
+        "points": timeseries.series(metric, start, end, step),
+    })
+
+
+STREAM_MAX_SECONDS = int(os.getenv("STREAM_MAX_SECONDS", 300))
+STREAM_HEARTBEAT_SECONDS = 15
+
+
+def sse(event_id: int, kind: str, payload: str) -> str:
+    return f"id: {event_id}\nevent: {kind}\ndata: {payload}\n\n"
+
+
+@route("/api/stream")
+def api_stream():
+    """Server-Sent Events: new Analytics rows ("analytics") and post status changes ("post").
+
+    Connections are closed after STREAM_MAX_SECONDS; EventSource reconnects with
+    Last-Event-ID and missed events are replayed from the StreamEvent table.
+    """
+    if "user" not in session:
+        return jsonify({"error": "unauthorized"}), 401
+    events.bus.start(current_app._get_current_object())
+    sub = events.bus.subscribe()
+    last_id = request.headers.get("Last-Event-ID", type=int)
+    backlog = events.recent_events(last_id) if last_id is not None else []
+    db.session.remove()
+
+    def generate():
+        replayed = {event_id for event_id, _, _ in backlog}
+        deadline = time.monotonic() + STREAM_MAX_SECONDS
+        try:
+            yield "retry: 3000\n\n"
+            for event_id, kind, payload in backlog:
+                yield sse(event_id, kind, payload)
+            while time.monotonic() < deadline and not sub.closed:
+                event = sub.get(timeout=STREAM_HEARTBEAT_SECONDS)
+                if event is None:
+                    yield ": ping\n\n"
+                    continue
+                event_id, kind, payload = event
+                if event_id in replayed:
+                    continue  # already sent from the backlog
+                yield sse(event_id, kind, payload)
+        finally:
+            events.bus.unsubscribe(sub)
+
+    return current_app.response_class(
+        generate(),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@route("/api/http_stats")
+def api_http_stats():
+    # connection reuse per upstream host (see http_client.py)
+    if "user" not in session:
+        return jsonify({"error": "unauthorized"}), 401
+    return jsonify(http_client.stats())
+
+
+@route("/api/workers")
+def api_workers():
+    # heartbeats of background workers (auto_scheduler.py)
+    if "user" not in session:
+        return jsonify({"error": "unauthorized"}), 401
+    return jsonify(heartbeat.status())
+
+
+@route("/metrics")
+def metrics():
+    # Prometheus text format; scrape with `Authorization: Bearer $METRICS_TOKEN`
+    if not metrics_authorized():
+        return jsonify({"error": "unauthorized"}), 401
+    gauges = [
+        (f"post_queue_{name}", f"Posts: {name.replace('_', ' ')}.", value)
+        for name, value in gauge_cache.get().items()
+    ]
+    gauges.append(("publish_tick_budget_seconds", "PUBLISH_TICK_BUDGET_SECONDS.", PUBLISH_TICK_BUDGET_SECONDS))
+    body = instrumentation.render(metric_snapshots(), gauges)
+    return current_app.response_class(body, mimetype="text/plain; version=0.0.4")
+
+
+@route("/api/metrics")
+def api_metrics():
+    # dashboard summary: queue gauges plus p50/p95 of the hot paths, merged across workers
+    if "user" not in session:
+        return jsonify({"error": "unauthorized"}), 401
+    timings = {}
+    for snapshot in metric_snapshots().values():
+        for name, metric in snapshot.items():
+            if metric["kind"] != "histogram":
+                continue
+            for values, data in metric["series"]:
+                key = f"{name}{{{','.join(values)}}}"
+                merged = timings.setdefault(key, {"buckets": [0] * len(instrumentation.BUCKETS), "sum": 0.0, "count": 0})
+                merged["buckets"] = [a + b for a, b in zip(merged["buckets"], data["buckets"])]
+                merged["sum"] += data["sum"]
+                merged["count"] += data["count"]
+    return jsonify({
+        "queue": gauge_cache.get(),
+        "tick_budget_seconds": PUBLISH_TICK_BUDGET_SECONDS,
+        "timings": {
+            key: {
+                "count": t["count"],
+                "avg": round(t["sum"] / t["count"], 4) if t["count"] else None,
+                "p50": instrumentation.quantile(t, 0.5),
+                "p95": instrumentation.quantile(t, 0.95),
+            }
+            for key, t in sorted(timings.items())
+        },
+    })
+
+
+@route("/api/rate_limits")
+def api_rate_limits():
+    if "user" not in session:
+        return jsonify({"error": "unauthorized"}), 401
+    return jsonify(limiter.snapshot())
 
 
-@app.route("/forgot_password", methods=["GET", "POST"])
+@route("/forgot_password", methods=["GET", "POST"])
 def forgot_password():
     if request.method == "POST":
         email = request.form.get("email")
@@ -399,9 +1326,9 @@ def forgot_password():
     return render_template("forgot_password.html")
 
 
-@app.route("/reset_password/<token>", methods=["GET", "POST"])
+@route("/reset_password/<token>", methods=["GET", "POST"])
 def reset_password(token):
-    s = URLSafeTimedSerializer(app.secret_key)
+    s = URLSafeTimedSerializer(current_app.secret_key)
     try:
         email = s.loads(token, salt="password-reset-salt", max_age=1800)
     except SignatureExpired:
@@ -422,20 +1349,226 @@ def reset_password(token):
     return render_template("reset_password.html")
 
 
-@app.route("/test_publer")
+@route("/run/<token>")
+def run_approvals(token):
+    # manual trigger; the worker (auto_scheduler.py) polls affiliates on its own schedule
+    if not MANUAL_RUN_TOKEN or not hmac.compare_digest(token, MANUAL_RUN_TOKEN):
+        return jsonify({"error": "forbidden"}), 403
+    return jsonify(poll_affiliates())
+
+
+@route("/post/<token>")
+def run_posts(token):
+    # manual trigger: plan and publish whatever is due now (the worker's dispatcher normally does)
+    if not MANUAL_RUN_TOKEN or not hmac.compare_digest(token, MANUAL_RUN_TOKEN):
+        return jsonify({"error": "forbidden"}), 403
+    process_pending_posts()
+    return jsonify({"ok": True, "msg": "Processed due posts"})
+
+
+@route("/test_publer")
 def test_publer():
     if not PUBLER_API_KEY or not PUBLER_WORKSPACE_ID:
         return jsonify({"error": "Missing Publer credentials."}), 400
     headers = {"Authorization": f"Bearer {PUBLER_API_KEY}"}
-    url = f"https://api.publer.io/v1/workspaces/{PUBLER_WORKSPACE_ID}/posts"
+    url = f"{PUBLER_API_URL}/workspaces/{PUBLER_WORKSPACE_ID}/posts"
     try:
-        r = requests.get(url, headers=headers, timeout=10)
+        r = http_client.get(url, headers=headers, timeout=10)
         return jsonify(r.json())
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
+# ---------------- CLI ----------------
+LEGACY_LOG_LINE = re.compile(r"^\[([^\]]+)\] (.*)$")
+LEGACY_PLATFORM_LINE = re.compile(r"^platform=(\S+) -> (.*)$", re.S)
+
+
+def split_legacy_log(post_id: int, text: str):
+    """Turn an old result_log blob ("\\n[iso-time] message" lines) into PostLogEntry rows."""
+    entries = []
+    attempt = 0
+    for line in (text or "").splitlines():
+        m = LEGACY_LOG_LINE.match(line)
+        if not m:
+            # continuation of a multi-line message (e.g. an API error body)
+            if entries and line:
+                entries[-1]["message"] += "\n" + line
+            continue
+        stamp, message = m.groups()
+        try:
+            created_at = datetime.fromisoformat(stamp)
+            if created_at.tzinfo:
+                created_at = created_at.astimezone(timezone.utc).replace(tzinfo=None)
+        except ValueError:
+            created_at = None
+        if message.startswith("Processing post"):
+            attempt += 1
+        platform = None
+        pm = LEGACY_PLATFORM_LINE.match(message)
+        if pm:
+            platform, message = pm.groups()
+        entries.append({
+            "post_id": post_id,
+            "platform": platform,
+            "attempt": max(attempt, 1),
+            "ok": None,
+            "message": message,
+            "created_at": created_at or datetime.utcnow(),
+        })
+    return entries
+
+
+@click.command("migrate-result-log")
+@click.option("--batch-size", default=500, show_default=True)
+def migrate_result_log(batch_size):
+    """Split legacy Post.result_log text into PostLogEntry rows. Safe to re-run."""
+    migrated = 0
+    while True:
+        rows = db.session.execute(
+            sa.select(Post.id, Post.result_log)
+            .where(Post.result_log.isnot(None))
+            .order_by(Post.id)
+            .limit(batch_size)
+        ).all()
+        if not rows:
+            break
+        entries = [e for post_id, text in rows for e in split_legacy_log(post_id, text)]
+        if entries:
+            db.session.execute(sa.insert(PostLogEntry), entries)
+        db.session.execute(
+            sa.update(Post).where(Post.id.in_([post_id for post_id, _ in rows])).values(result_log=None)
+        )
+        db.session.commit()
+        migrated += len(rows)
+    print(f"Migrated result_log for {migrated} posts.")
+
+
+@click.command("ingest-affiliates")
+def ingest_affiliates():
+    """Pull new approved affiliate transactions and queue their links for posting."""
+    for result in poll_affiliates():
+        print(result)
+
+
+@click.command("backfill-metrics")
+def backfill_metrics():
+    """Copy numeric Analytics rows older than the metric store into it and rebuild the rollups."""
+    first = db.session.scalar(sa.select(sa.func.min(MetricSample.ts)))
+    query = sa.select(Analytics.metric_name, Analytics.metric_value, Analytics.created_at).where(
+        Analytics.created_at.isnot(None)
+    )
+    if first is not None:
+        query = query.where(Analytics.created_at < first)
+    copied = 0
+    oldest = None
+    for name, value, created_at in db.session.execute(query).all():
+        if timeseries.record(name, value, created_at):
+            copied += 1
+            oldest = created_at if oldest is None else min(oldest, created_at)
+    db.session.commit()
+    if oldest is not None:
+        timeseries.rollup(since=oldest)
+    print(f"Backfilled {copied} metric samples.")
+
+
+@click.command("import-posts")
+@click.argument("csv_path", type=click.Path(exists=True, dir_okay=False))
+@click.option("--chunk-size", default=post_import.CHUNK_SIZE, show_default=True)
+def import_posts(csv_path, chunk_size):
+    """Queue posts from a posts.csv-format file (post_text, platform, link, image_url)."""
+    with open(csv_path, newline="", encoding="utf-8-sig") as f:
+        summary = post_import.import_rows(csv.DictReader(f), set(PLATFORM_POSTERS), chunk_size)
+    for err in summary.pop("errors"):
+        print(f"row {err['row']}: {err['error']}")
+    print(summary)
+
+
+@click.command("dedup-backfill")
+@click.option("--batch-size", default=1000, show_default=True)
+@click.option("--rebuild", is_flag=True, help="recompute every fingerprint (after changing dedup.py parameters)")
+def dedup_backfill(batch_size, rebuild):
+    """Fingerprint posts queued before the dedup index existed."""
+    if rebuild:
+        db.session.execute(sa.delete(dedup.PostSignatureBand))
+        db.session.commit()
+    last_id, done = 0, 0
+    while True:
+        query = sa.select(Post.id, Post.body, Post.link, Post.created_at).where(Post.id > last_id)
+        if not rebuild:
+            query = query.where(Post.body_hash.is_(None), Post.minhash.is_(None))
+        rows = db.session.execute(query.order_by(Post.id).limit(batch_size)).all()
+        if not rows:
+            break
+        fingerprints = [(r.id, dedup.Fingerprint(r.body or "", r.link), r.created_at or datetime.utcnow()) for r in rows]
+        db.session.execute(
+            sa.delete(dedup.PostSignatureBand).where(dedup.PostSignatureBand.post_id.in_([r.id for r in rows]))
+        )
+        db.session.execute(
+            sa.update(Post.__table__).where(Post.__table__.c.id == sa.bindparam("b_id")).values(
+                link_hash=sa.bindparam("b_link_hash"), body_hash=sa.bindparam("b_body_hash"), minhash=sa.bindparam("b_minhash")
+            ),
+            [{"b_id": post_id, **{f"b_{k}": v for k, v in fp.columns().items()}} for post_id, fp, _ in fingerprints],
+        )
+        dedup.index(fingerprints)
+        db.session.commit()
+        done += len(rows)
+        last_id = rows[-1].id
+        print(f"fingerprinted {done} posts (last id {last_id})")
+    print(f"Done: {done} posts fingerprinted.")
+
+
+@click.command("init-db")
+def init_db():
+    """Create tables and apply additive schema upgrades."""
+    ensure_schema()
+    print("Schema is up to date.")
+
+
+# ---------------- APP FACTORY ----------------
+def create_app(init_schema: bool = False, run_scheduler: bool = False):
+    app = Flask(__name__, template_folder="templates", static_folder="static")
+    app.secret_key = os.getenv("APP_SECRET_KEY", "supersecretkey")
+
+    # DB config (auto switch postgres url format)
+    db_url = os.getenv("DATABASE_URL", "sqlite:///local.db")
+    if db_url.startswith("postgres://"):
+        db_url = db_url.replace("postgres://", "postgresql://")
+    app.config["SQLALCHEMY_DATABASE_URI"] = db_url
+    app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+
+    # Uploads (for images)
+    os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+    app.config["UPLOAD_FOLDER"] = UPLOAD_FOLDER
+    app.config["MAX_CONTENT_LENGTH"] = MAX_UPLOAD_BYTES
+
+    db.init_app(app)
+    instrumentation.instrument_sql()
+    for rule, view, options in ROUTES:
+        app.add_url_rule(rule, view_func=view, **options)
+    app.cli.add_command(migrate_result_log)
+    app.cli.add_command(init_db)
+    app.cli.add_command(ingest_affiliates)
+    app.cli.add_command(backfill_metrics)
+    app.cli.add_command(import_posts)
+    app.cli.add_command(dedup_backfill)
+
+    if init_schema:
+        with app.app_context():
+            ensure_schema()
+    if run_scheduler:
+        app.extensions["scheduler"] = start_scheduler(app)
+    return app
+
+
+app = create_app()
+
+
 # ---------------- MAIN ----------------
 if __name__ == "__main__":
     # Only run the dev server here; production should use gunicorn
+    with app.app_context():
+        ensure_schema()
+    if RUN_SCHEDULER:
+        app.extensions["scheduler"] = start_scheduler(app)
     app.run(host="0.0.0.0", port=int(os.getenv("PORT", 5000)), debug=False)
@@ -1,12 +1,34 @@
 # auto_scheduler.py
-import time
-from app import poll_and_append_job, posting_job, start_scheduler
+"""Dedicated background worker: `python auto_scheduler.py`.
 
-print("🚀 SlickOfficials Scheduler started — hands-free mode activated")
+Runs the publishing dispatcher plus the analytics, metric rollup and affiliate polling
+jobs (app.start_scheduler) in a process of its own, so gunicorn web workers
+(RUN_SCHEDULER=false) only serve requests and adding web capacity adds no background
+load. The worker reports to the worker_heartbeat table (see heartbeat.py, /api/workers);
+with several workers running, singleton jobs only run on the leader. Concurrency is set
+with SCHEDULER_JOB_THREADS, *_MAX_IN_FLIGHT, CLAIM_BATCH_SIZE and MEDIA_WORKERS.
+"""
+import signal
+import threading
 
-# Start the same BackgroundScheduler (so we keep the same timing)
-start_scheduler()
+from app import app, ensure_schema, start_scheduler
 
-# Keep the worker alive forever (Render restarts it if it crashes)
-while True:
-    time.sleep(3600)
+
+def main():
+    with app.app_context():
+        ensure_schema()
+    scheduler = start_scheduler(app)
+    print("🚀 SlickOfficials Scheduler started — hands-free mode activated")
+
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+    signal.signal(signal.SIGINT, lambda *_: stop.set())
+    stop.wait()
+
+    print("Scheduler stopping...")
+    app.extensions["dispatcher"].stop()
+    scheduler.shutdown(wait=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,13 @@
+# batching.py
+"""Fixed-size batching for bulk queries and inserts (IN lists, executemany chunks, API pages)."""
+from itertools import islice
+
+
+def chunked(iterable, size: int):
+    """Yield lists of up to `size` items; consumes the iterable lazily, so it works on streams."""
+    it = iter(iterable)
+    while True:
+        chunk = list(islice(it, size))
+        if not chunk:
+            return
+        yield chunk
@@ -0,0 +1,100 @@
+# bench/import_time.py
+"""Worker boot benchmark.
+
+Measures what a gunicorn worker / cron invocation pays to `import app`, using
+`python -X importtime` in fresh interpreters, and compares it with the old eager boot
+(schema creation + scheduler start on import), reproduced with --eager.
+
+    python bench/import_time.py            # lazy boot (current default)
+    python bench/import_time.py --eager    # plus ensure_schema() and start_scheduler()
+    python bench/import_time.py --runs 10 --top 15
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+LAZY = "import app"
+EAGER = (
+    "import app\n"
+    "with app.app.app_context():\n"
+    "    app.ensure_schema()\n"
+    "app.start_scheduler(app.app).shutdown(wait=False)\n"
+)
+TIMER = (
+    "import time, sys\n"
+    "t = time.perf_counter()\n"
+    "{code}\n"
+    "sys.stdout.write(str((time.perf_counter() - t) * 1000))\n"
+)
+
+
+def run_once(code, env, importtime=False):
+    args = [sys.executable]
+    if importtime:
+        args += ["-X", "importtime"]
+    args += ["-c", TIMER.format(code=code)]
+    proc = subprocess.run(args, cwd=ROOT, env=env, capture_output=True, text=True, check=True)
+    return float(proc.stdout.strip().splitlines()[-1]), proc.stderr
+
+
+def parse_importtime(stderr, root="app"):
+    """Return (cumulative_us of `root`, [(cumulative_us, module)] imported directly by it).
+
+    -X importtime prints children before their parent, indented two spaces per level.
+    """
+    children = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if not cumulative.strip().isdigit():
+            continue
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        if depth == 1:
+            children.append((int(cumulative), name.strip()))
+        elif depth == 0:
+            if name.strip() == root:
+                return int(cumulative), children
+            children = []
+    return None, []
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--eager", action="store_true", help="also create the schema and start the scheduler")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10)
+    opts = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ)
+        env.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        env.setdefault("UPLOAD_FOLDER", os.path.join(tmp, "uploads"))
+        env["RUN_SCHEDULER"] = "false"
+        code = EAGER if opts.eager else LAZY
+
+        run_once(code, env)  # warm the bytecode cache and the DB file
+        timings = [run_once(code, env)[0] for _ in range(opts.runs)]
+        _, stderr = run_once(code, env, importtime=True)
+
+    total, direct = parse_importtime(stderr)
+    direct = sorted(direct, reverse=True)[: opts.top]
+
+    mode = "eager (schema + scheduler)" if opts.eager else "lazy"
+    print(f"boot mode: {mode}")
+    print(f"wall time over {opts.runs} runs: median {statistics.median(timings):.1f} ms, "
+          f"min {min(timings):.1f} ms, max {max(timings):.1f} ms")
+    if total is not None:
+        print(f"`import app` cumulative import time: {total / 1000:.1f} ms")
+    print("heaviest direct imports of app:")
+    for us, name in direct:
+        print(f"  {us / 1000:8.1f} ms  {name}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,217 @@
+# bench/mock_apis.py
+"""Local stand-ins for the Graph API, Publer, Awin and Rakuten.
+
+Each service runs on its own keep-alive ThreadingHTTPServer with a Behavior: added
+latency (fixed + uniform jitter), a share of 500s and a share of 429s carrying a
+Retry-After header. Responses have the shapes the real clients in app.py,
+poster/publer_poster.py and affiliates/ read; affiliate transactions are generated
+from the requested date range / page, so the servers keep no data.
+
+Used by bench/pipeline.py, or standalone to point a dev instance at them:
+
+    python bench/mock_apis.py --latency-ms 80 --error-rate 0.02 --rate-429 0.01
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+SERVICES = ("graph", "publer", "awin", "rakuten")
+RAKUTEN_PAGE_LIMIT = 1000
+MULTIPART_SESSION = re.compile(rb'name="upload_session_id"\r\n\r\n([^\r]+)')
+
+
+class Behavior:
+    def __init__(self, latency_ms=50.0, jitter_ms=20.0, error_rate=0.0, rate_429=0.0, retry_after=1.0, transactions=1000):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.rate_429 = rate_429
+        self.retry_after = retry_after
+        self.transactions = transactions  # per Awin window / per Rakuten query
+
+    def delay(self):
+        return (self.latency_ms + random.uniform(0, self.jitter_ms)) / 1000.0
+
+    def outcome(self):
+        roll = random.random()
+        if roll < self.rate_429:
+            return 429
+        if roll < self.rate_429 + self.error_rate:
+            return 500
+        return 200
+
+
+def _stamp(start: datetime, end: datetime, i: int, n: int) -> str:
+    return (start + (end - start) * (i + 0.5) / n).strftime("%Y-%m-%dT%H:%M:%S")
+
+
+def awin_transactions(query, n):
+    start = datetime.fromisoformat(query["startDate"])
+    end = datetime.fromisoformat(query["endDate"])
+    key = start.strftime("%Y%m%d%H%M%S")
+    return [
+        {"id": f"{key}-{i}", "validationDate": _stamp(start, end, i, n), "url": f"https://shop.example/awin/{key}/{i}"}
+        for i in range(n)
+    ]
+
+
+def rakuten_transactions(query, n):
+    start = datetime.fromisoformat(query["process_date_start"])
+    end = datetime.fromisoformat(query["process_date_end"])
+    limit = int(query.get("limit", RAKUTEN_PAGE_LIMIT))
+    page = int(query.get("page", 1))
+    key = start.strftime("%Y%m%d%H%M%S")
+    return [
+        {
+            "etransaction_id": f"{key}-{i}",
+            "process_date": _stamp(start, end, i, n),
+            "product_url": f"https://shop.example/rakuten/{key}/{i}",
+            "product_name": f"Product {i}",
+        }
+        for i in range((page - 1) * limit, min(n, page * limit))
+    ]
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like the real APIs
+    disable_nagle_algorithm = True  # headers and body go out as separate writes; don't add delayed-ACK stalls
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body, headers=None):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _handle(self):
+        server = self.server
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else b""
+        with server.lock:
+            server.requests += 1
+        time.sleep(server.behavior.delay())
+        status = server.behavior.outcome()
+        if status == 429:
+            return self._send(429, {"error": {"message": "rate limited", "code": 4}}, {"Retry-After": str(server.behavior.retry_after)})
+        if status == 500:
+            return self._send(500, {"error": {"message": "internal error", "code": 1}})
+        url = urlsplit(self.path)
+        query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        self._send(200, getattr(self, f"_{server.service}")(url.path, query, body))
+
+    do_GET = _handle
+    do_POST = _handle
+
+    def _graph(self, path, query, body):
+        if not path.endswith("/videos"):
+            return {"id": f"page_{self.server.requests}", "post_id": f"post_{self.server.requests}"}
+        form = {k: v[-1] for k, v in parse_qs(body.decode("latin-1")).items()} if b"upload_phase=" in body[:4096] else {}
+        sessions = self.server.sessions
+        phase = form.get("upload_phase", "transfer")  # transfer requests are multipart
+        if phase == "start":
+            session_id = str(len(sessions) + 1)
+            sessions[session_id] = int(form.get("file_size", 0))
+            return {"upload_session_id": session_id, "video_id": f"video_{session_id}", "start_offset": "0", "end_offset": str(sessions[session_id])}
+        if phase == "finish":
+            return {"success": True}
+        match = MULTIPART_SESSION.search(body)
+        size = sessions.get(match.group(1).decode() if match else "", 0)
+        return {"start_offset": str(size), "end_offset": str(size)}  # whole file in one chunk
+
+    def _publer(self, path, query, body):
+        if self.command == "GET":
+            return {"data": [{"id": i} for i in range(25)]}
+        return {"id": f"publer_{self.server.requests}", "status": "scheduled"}
+
+    def _awin(self, path, query, body):
+        return awin_transactions(query, self.server.behavior.transactions)
+
+    def _rakuten(self, path, query, body):
+        return rakuten_transactions(query, self.server.behavior.transactions)
+
+
+class MockServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, service: str, behavior: Behavior, port: int = 0):
+        super().__init__(("127.0.0.1", port), Handler)
+        self.service = service
+        self.behavior = behavior
+        self.requests = 0
+        self.sessions = {}
+        self.lock = threading.Lock()
+        self.thread = None
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.serve_forever, name=f"mock-{self.service}", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+def start_all(behavior: Behavior, ports=None):
+    ports = ports or {}
+    return {service: MockServer(service, behavior, ports.get(service, 0)).start() for service in SERVICES}
+
+
+def environment(servers):
+    """Environment variables that point the app's clients at the mock servers."""
+    return {
+        "FB_GRAPH_URL": servers["graph"].url,
+        "FB_GRAPH_VIDEO_URL": servers["graph"].url,
+        "PUBLER_API_URL": f"{servers['publer'].url}/v1",
+        "AWIN_API_URL": servers["awin"].url + "/publishers/{publisher_id}/transactions",
+        "RAKUTEN_API_URL": f"{servers['rakuten'].url}/events/1.0/transactions",
+    }
+
+
+def add_behavior_arguments(parser):
+    parser.add_argument("--latency-ms", type=float, default=50.0, help="fixed latency added to every mock response")
+    parser.add_argument("--jitter-ms", type=float, default=20.0, help="plus uniform random jitter up to this")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests answered with a 500")
+    parser.add_argument("--rate-429", type=float, default=0.0, help="share of requests answered with a 429")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Retry-After seconds sent with a 429")
+
+
+def behavior_from(opts, transactions=1000):
+    return Behavior(opts.latency_ms, opts.jitter_ms, opts.error_rate, opts.rate_429, opts.retry_after, transactions)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    add_behavior_arguments(parser)
+    parser.add_argument("--transactions", type=int, default=1000, help="affiliate transactions per query")
+    parser.add_argument("--base-port", type=int, default=9100, help="graph, publer, awin, rakuten get consecutive ports")
+    opts = parser.parse_args()
+
+    servers = start_all(behavior_from(opts, opts.transactions), {s: opts.base_port + i for i, s in enumerate(SERVICES)})
+    for name, value in environment(servers).items():
+        print(f"export {name}='{value}'")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        for server in servers.values():
+            server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,389 @@
+# bench/pipeline.py
+"""Offline throughput benchmark for the publishing pipeline.
+
+Runs the real code paths against the local mock servers in bench/mock_apis.py, each
+scenario in a fresh interpreter with its own throwaway SQLite database and data files:
+
+    publish     seed the Post table with --rows due posts, drain it with
+                process_pending_posts() (Graph API for facebook; the other posters are stubs)
+    publer      seed posts.csv with --rows offers, post them one by one with post_next()
+    affiliates  one poll_all() over Awin and Rakuten, each returning --rows transactions
+
+and reports items/sec, p50/p99 latency of the outbound calls, DB commits per item and
+peak memory (max RSS; plus the traced Python heap with --trace-memory).
+
+    python bench/pipeline.py --rows 10000
+    python bench/pipeline.py publish --rows 100000 --latency-ms 120 --error-rate 0.02 --rate-429 0.01
+    python bench/pipeline.py --save baseline.json
+    python bench/pipeline.py --compare baseline.json --tolerance 0.15   # exit 1 on regression
+
+Rate limits from config.yaml are lifted unless --keep-limits is given (otherwise the
+daily quotas, not the code, decide throughput). DATABASE_URL is honoured by passing
+--database-url (e.g. a scratch Postgres); the tables are created in it and not dropped.
+"""
+import argparse
+import contextlib
+import csv
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+import yaml
+
+import mock_apis
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCENARIOS = ("publish", "publer", "affiliates")
+UNLIMITED = 10 ** 9
+SEED_CHUNK = 5000
+
+
+def percentile(samples, q):
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, round(q * (len(ordered) - 1)))]
+
+
+class Timings:
+    """Wall time of every call to the wrapped functions."""
+
+    def __init__(self):
+        self.samples = []
+        self.lock = threading.Lock()
+
+    def wrap(self, fn):
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start
+                with self.lock:
+                    self.samples.append(elapsed)
+        return timed
+
+
+# ---------- environment ----------
+def bench_config(tmp, keep_limits):
+    with open(os.path.join(ROOT, "config.yaml"), encoding="utf-8") as f:
+        cfg = yaml.safe_load(f) or {}
+    if not keep_limits:
+        cfg["rate_limits"] = {p: {"per_minute": UNLIMITED, "burst": UNLIMITED} for p in cfg.get("rate_limits") or {}}
+        cfg.setdefault("publer", {})["max_posts_per_day"] = UNLIMITED
+    path = os.path.join(tmp, "config.yaml")
+    with open(path, "w", encoding="utf-8") as f:
+        yaml.safe_dump(cfg, f)
+    return path
+
+
+def prepare_environment(tmp, servers, opts):
+    """Point every setting the app reads at import time at the temp dir and the mocks."""
+    os.environ.update(mock_apis.environment(servers))
+    os.environ.update({
+        "DATABASE_URL": opts.database_url or f"sqlite:///{os.path.join(tmp, 'bench.db')}",
+        "CONFIG_FILE": bench_config(tmp, opts.keep_limits),
+        "UPLOAD_FOLDER": os.path.join(tmp, "uploads"),
+        "POSTS_FILE": os.path.join(tmp, "posts.csv"),
+        "POSTED_LOG": os.path.join(tmp, "posted_log.csv"),
+        "POSTER_DB": os.path.join(tmp, "poster.db"),
+        "TEMPLATES_FILE": os.path.join(ROOT, "data", "templates.csv"),
+        "RUN_SCHEDULER": "false",
+        "RETRY_BASE_SECONDS": str(opts.retry_base_seconds),
+        "META_ACCESS_TOKEN": "bench",
+        "META_PAGE_ID": "bench-page",
+        "INSTAGRAM_BUSINESS_ID": "bench",
+        "TWITTER_BEARER_TOKEN": "bench",
+        "TIKTOK_ACCESS_TOKEN": "bench",
+        "PUBLER_API_KEY": "bench",
+        "PUBLER_ID": "bench",
+        "PUBLER_WORKSPACE_ID": "bench",
+        "AWIN_API_TOKEN": "bench",
+        "AWIN_PUBLISHER_ID": "1",
+        "RAKUTEN_API_TOKEN": "bench",
+    })
+    sys.path.insert(0, ROOT)
+
+
+def count_commits(engine):
+    import sqlalchemy as sa
+
+    counter = [0]
+    sa.event.listen(engine, "commit", lambda conn: counter.__setitem__(0, counter[0] + 1))
+    return counter
+
+
+def count_store_commits(store):
+    """Transactions on the poster's SQLite store: explicit COMMITs plus autocommitted writes."""
+    counter = [0]
+    traced = set()
+    original = store.conn
+
+    def conn():
+        c = original()
+        if id(c) not in traced:
+            traced.add(id(c))
+            in_tx = [False]
+
+            def trace(statement):
+                verb = statement.lstrip()[:6].upper()
+                if verb.startswith("BEGIN"):
+                    in_tx[0] = True
+                elif verb == "COMMIT":
+                    in_tx[0] = False
+                    counter[0] += 1
+                elif verb in ("INSERT", "UPDATE", "DELETE") and not in_tx[0]:
+                    counter[0] += 1
+
+            c.set_trace_callback(trace)
+        return c
+
+    store.conn = conn
+    return counter
+
+
+# ---------- scenarios ----------
+def seed_posts(app_module, rows, platforms):
+    import sqlalchemy as sa
+    from models import Post, db
+
+    due = datetime.utcnow() - timedelta(seconds=1)
+    for start in range(0, rows, SEED_CHUNK):
+        db.session.execute(sa.insert(Post), [
+            {"title": f"Bench post {i}", "body": f"Bench post {i} https://shop.example/p/{i} #ad",
+             "platforms": platforms, "status": "pending", "scheduled_for": due, "created_at": due}
+            for i in range(start, min(rows, start + SEED_CHUNK))
+        ])
+    db.session.commit()
+
+
+def run_publish(app_module, opts, timings):
+    import sqlalchemy as sa
+    from models import Post, db
+
+    seed_posts(app_module, opts.rows, opts.platforms)
+    for platform, poster in list(app_module.PLATFORM_POSTERS.items()):
+        app_module.PLATFORM_POSTERS[platform] = timings.wrap(poster)
+    commits = count_commits(db.engine)
+
+    def measured():
+        deadline = time.monotonic() + opts.max_seconds
+        while True:
+            app_module.process_pending_posts()
+            left, next_due = db.session.execute(
+                sa.select(sa.func.count(), sa.func.min(Post.scheduled_for)).where(Post.status.in_(("pending", "processing")))
+            ).one()
+            remaining = deadline - time.monotonic()
+            if not left or remaining <= 0:
+                return
+            wait = (next_due - datetime.utcnow()).total_seconds() if next_due else 0.1
+            time.sleep(min(max(wait, 0.05), remaining))
+
+    def summary():
+        counts = dict(db.session.execute(sa.select(Post.status, sa.func.count()).group_by(Post.status)).all())
+        return {"items": counts.get("posted", 0), "failed": counts.get("failed", 0),
+                "unfinished": counts.get("pending", 0) + counts.get("processing", 0), "commits": commits[0]}
+
+    return measured, summary
+
+
+def run_publer(app_module, opts, timings):
+    from poster import publer_poster
+    from ratelimit import limiter
+
+    with open(os.environ["POSTS_FILE"], "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=["post_text", "platform", "link", "image_url"])
+        writer.writeheader()
+        writer.writerows(
+            {"post_text": f"Bench offer {i} [Link] #ad", "platform": "instagram,facebook,twitter,tiktok",
+             "link": f"https://shop.example/o/{i}", "image_url": ""}
+            for i in range(opts.rows)
+        )
+    publer_poster.ensure_posted_log()
+    publer_poster.store.sync_catalogue()
+    publer_poster.post_to_publer = timings.wrap(publer_poster.post_to_publer)
+    commits = count_store_commits(publer_poster.store)
+    state = {"posted": 0, "attempts": 0}
+
+    def measured():
+        deadline = time.monotonic() + opts.max_seconds
+        while state["posted"] < opts.rows and time.monotonic() < deadline:
+            state["attempts"] += 1
+            if publer_poster.post_next():
+                state["posted"] += 1
+            elif limiter.snapshot().get("publer", {}).get("blocked_for"):
+                time.sleep(0.05)
+
+    def summary():
+        return {"items": state["posted"], "failed": state["attempts"] - state["posted"],
+                "unfinished": opts.rows - state["posted"], "commits": commits[0]}
+
+    return measured, summary
+
+
+def run_affiliates(app_module, opts, timings):
+    import http_client
+    from affiliates.poller import poll_all
+    from models import db
+    from poster import publer_poster
+
+    http_client.request = timings.wrap(http_client.request)
+    commits = count_commits(db.engine)
+    store_commits = count_store_commits(publer_poster.store)
+    results = []
+
+    def measured():
+        results.extend(poll_all(app_module.app))
+
+    def summary():
+        return {"items": sum(r.get("fetched", 0) for r in results),
+                "failed": sum(1 for r in results if r.get("error")),
+                "unfinished": 0,
+                "commits": commits[0] + store_commits[0],
+                "networks": results}
+
+    return measured, summary
+
+
+RUNNERS = {"publish": run_publish, "publer": run_publer, "affiliates": run_affiliates}
+
+
+def run_child(scenario, opts):
+    """Run one scenario in this process and print its result as JSON on the last line."""
+    behavior = mock_apis.behavior_from(opts, transactions=opts.rows)
+    servers = mock_apis.start_all(behavior)
+    with tempfile.TemporaryDirectory() as tmp:
+        prepare_environment(tmp, servers, opts)
+        quiet = open(os.devnull, "w") if not opts.verbose else None
+        with contextlib.redirect_stdout(quiet or sys.stdout):
+            import app as app_module
+
+            with app_module.app.app_context():
+                app_module.ensure_schema()
+                timings = Timings()
+                measured, summary = RUNNERS[scenario](app_module, opts, timings)
+                if opts.trace_memory:
+                    tracemalloc.start()
+                started = time.perf_counter()
+                measured()
+                elapsed = time.perf_counter() - started
+                traced_peak = tracemalloc.get_traced_memory()[1] if opts.trace_memory else None
+                result = summary()
+                app_module.db.engine.dispose()
+        if quiet:
+            quiet.close()
+    for server in servers.values():
+        server.stop()
+
+    items = result.pop("items")
+    result.update({
+        "scenario": scenario,
+        "rows": opts.rows,
+        "items": items,
+        "seconds": round(elapsed, 3),
+        "items_per_second": round(items / elapsed, 2) if elapsed else None,
+        "p50_ms": round(percentile(timings.samples, 0.50) * 1000, 1) if timings.samples else None,
+        "p99_ms": round(percentile(timings.samples, 0.99) * 1000, 1) if timings.samples else None,
+        "calls": len(timings.samples),
+        "commits_per_item": round(result["commits"] / items, 3) if items else None,
+        "max_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "traced_peak_mb": round(traced_peak / 2 ** 20, 1) if traced_peak is not None else None,
+    })
+    print(json.dumps(result))
+
+
+# ---------- driver ----------
+def run_scenario(scenario, argv):
+    proc = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), scenario, "--child", *argv],
+        cwd=ROOT, capture_output=True, text=True,
+    )
+    if proc.returncode != 0:
+        sys.stderr.write(proc.stderr)
+        raise SystemExit(f"{scenario} benchmark failed")
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def print_results(results):
+    print(f"{'scenario':<11} {'items':>8} {'failed':>7} {'secs':>8} {'items/s':>9} {'p50 ms':>8} {'p99 ms':>8} "
+          f"{'commits/item':>13} {'rss MB':>8} {'heap MB':>8}")
+    for r in results:
+        cells = [r["items"], r["failed"], r["seconds"], r["items_per_second"], r["p50_ms"], r["p99_ms"],
+                 r["commits_per_item"], r["max_rss_mb"], r["traced_peak_mb"]]
+        widths = [8, 7, 8, 9, 8, 8, 13, 8, 8]
+        print(f"{r['scenario']:<11} " + " ".join(f"{'-' if c is None else c:>{w}}" for c, w in zip(cells, widths)))
+        if r.get("unfinished"):
+            print(f"  {r['unfinished']} items still queued after --max-seconds")
+
+
+def regressions(results, baseline, tolerance):
+    """Messages for every scenario that is slower or commits more than the baseline allows."""
+    previous = {r["scenario"]: r for r in baseline}
+    found = []
+    for r in results:
+        old = previous.get(r["scenario"])
+        if not old:
+            continue
+        if old["items_per_second"] and (r["items_per_second"] or 0) < old["items_per_second"] * (1 - tolerance):
+            found.append(f"{r['scenario']}: {r['items_per_second']} items/s vs {old['items_per_second']} baseline")
+        if old["p99_ms"] and r["p99_ms"] and r["p99_ms"] > old["p99_ms"] * (1 + tolerance):
+            found.append(f"{r['scenario']}: p99 {r['p99_ms']} ms vs {old['p99_ms']} ms baseline")
+        if old["commits_per_item"] and r["commits_per_item"] and r["commits_per_item"] > old["commits_per_item"] * (1 + tolerance):
+            found.append(f"{r['scenario']}: {r['commits_per_item']} commits/item vs {old['commits_per_item']} baseline")
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("scenarios", nargs="*", metavar="scenario", help=f"any of {', '.join(SCENARIOS)} (default: all)")
+    parser.add_argument("--rows", type=int, default=1000, help="posts / offers / transactions per network to run through")
+    parser.add_argument("--platforms", default="facebook", help="Post.platforms for seeded posts (publish)")
+    parser.add_argument("--max-seconds", type=float, default=600, help="stop draining after this long")
+    parser.add_argument("--retry-base-seconds", type=float, default=0.5, help="RETRY_BASE_SECONDS for the run")
+    parser.add_argument("--keep-limits", action="store_true", help="keep config.yaml rate limits and quotas")
+    parser.add_argument("--database-url", help="database to benchmark against (default: a temp SQLite file)")
+    parser.add_argument("--trace-memory", action="store_true", help="also report tracemalloc peak (slows the run)")
+    parser.add_argument("--verbose", action="store_true", help="keep the app's own output")
+    parser.add_argument("--save", metavar="FILE", help="write results as JSON")
+    parser.add_argument("--compare", metavar="FILE", help="compare with results saved by --save")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="allowed relative regression for --compare")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    mock_apis.add_behavior_arguments(parser)
+    argv = sys.argv[1:]
+    opts = parser.parse_args(argv)
+    unknown = set(opts.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenario(s): {', '.join(sorted(unknown))}")
+    opts.scenarios = opts.scenarios or list(SCENARIOS)
+
+    if opts.child:
+        return run_child(opts.scenarios[0], opts)
+
+    passthrough = [a for a in argv if a not in SCENARIOS]
+    results = []
+    for scenario in dict.fromkeys(opts.scenarios):
+        print(f"running {scenario} ({opts.rows} rows)...", file=sys.stderr)
+        results.append(run_scenario(scenario, passthrough))
+    print_results(results)
+
+    if opts.save:
+        with open(opts.save, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    if opts.compare:
+        with open(opts.compare, encoding="utf-8") as f:
+            found = regressions(results, json.load(f), opts.tolerance)
+        for message in found:
+            print(f"REGRESSION {message}")
+        if found:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
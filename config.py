@@ -0,0 +1,20 @@
+# config.py
+"""Loads config.yaml once and hands out sections of it."""
+import os
+from functools import lru_cache
+
+import yaml
+
+CONFIG_FILE = os.getenv("CONFIG_FILE", os.path.join(os.path.dirname(os.path.abspath(__file__)), "config.yaml"))
+
+
+@lru_cache(maxsize=1)
+def load_config():
+    if not os.path.exists(CONFIG_FILE):
+        return {}
+    with open(CONFIG_FILE, encoding="utf-8") as f:
+        return yaml.safe_load(f) or {}
+
+
+def section(name: str):
+    return load_config().get(name) or {}
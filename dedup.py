@@ -0,0 +1,259 @@
+# dedup.py
+"""Duplicate and near-duplicate detection for queued posts.
+
+Every Post gets a fingerprint when it is queued:
+
+* link_hash: digest of its normalized link (scheme, www., tracking parameters and
+  trailing slashes dropped), taken from Post.link or the first URL in the body;
+* body_hash: digest of the normalized body (case-folded words, normalized URLs);
+* minhash: a MinHash signature over SHINGLE_SIZE-character shingles of the normalized body,
+  built with one-permutation hashing (one hash per shingle, not one per permutation).
+
+The signature is cut into BANDS bands of ROWS values; each band is hashed into a
+PostSignatureBand row. Posts whose signatures agree on any whole band are candidates
+(locality-sensitive hashing), so a lookup is one indexed probe per band, bounded by the
+window, instead of a comparison with every stored post. Candidates are confirmed by
+comparing full signatures (estimated Jaccard similarity >= threshold).
+
+window_days, threshold and action come from the dedup section of config.yaml. Changing
+SHINGLE_SIZE, NUM_PERM, BANDS or ROWS requires `flask --app app dedup-backfill --rebuild`.
+"""
+import hashlib
+import re
+import struct
+import unicodedata
+from collections import defaultdict
+from datetime import datetime, timedelta
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+import sqlalchemy as sa
+
+import config
+from batching import chunked
+from models import Post, PostSignatureBand, db
+
+SHINGLE_SIZE = 5
+NUM_PERM = 64
+BANDS = 16
+ROWS = NUM_PERM // BANDS  # 16 x 4: ~50% similar posts become candidates, >99.9% of 80% similar ones do
+URL = re.compile(r"https?://\S+|www\.\S+", re.IGNORECASE)
+WORD = re.compile(r"\w+")
+TRACKING_PARAMS = re.compile(r"^(utm_\w+|fbclid|gclid|msclkid|mc_cid|mc_eid|ref|igshid)$", re.IGNORECASE)
+LOOKUP_CHUNK = 500  # values per IN (...) list
+MAX_CANDIDATES = 200  # newest band matches verified per post; a hugely reused caption can't blow up a lookup
+MAX_HASH = (1 << 64) - 1
+EMPTY_BIN = 0xFFFFFFFF
+
+
+def settings():
+    s = {"window_days": 30, "threshold": 0.8, "action": "skip"}
+    s.update(config.section("dedup"))
+    return s
+
+
+# ---------- normalization ----------
+def normalize_link(url: str) -> str:
+    """'https://www.Shop.com/p/1/?utm_source=x&b=2&a=1' -> 'shop.com/p/1?a=1&b=2'."""
+    url = url.strip().rstrip(").,!?;:'\"")
+    parts = urlsplit(url if "://" in url else f"http://{url}")
+    host = (parts.hostname or "").lower().removeprefix("www.")
+    query = sorted((k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True) if not TRACKING_PARAMS.match(k))
+    path = parts.path.rstrip("/")
+    return f"{host}{path}" + (f"?{urlencode(query)}" if query else "")
+
+
+def normalize_text(text: str) -> str:
+    """Case-folded words and normalized URLs, single-spaced; punctuation and emoji dropped."""
+    text = unicodedata.normalize("NFKC", text or "")
+    tokens = []
+    last = 0
+    for match in URL.finditer(text):
+        tokens += WORD.findall(text[last:match.start()].casefold())
+        tokens.append(normalize_link(match.group(0)))
+        last = match.end()
+    tokens += WORD.findall(text[last:].casefold())
+    return " ".join(tokens)
+
+
+def first_link(text: str):
+    match = URL.search(text or "")
+    return match.group(0) if match else None
+
+
+def digest(text: str) -> str:
+    return hashlib.blake2b(text.encode(), digest_size=16).hexdigest()
+
+
+# ---------- signatures ----------
+def shingles(text: str, size: int = SHINGLE_SIZE):
+    if len(text) <= size:
+        return {text} if text else set()
+    return {text[i:i + size] for i in range(len(text) - size + 1)}
+
+
+def _hash64(value: str) -> int:
+    return int.from_bytes(hashlib.blake2b(value.encode(), digest_size=8).digest(), "big")
+
+
+def minhash(items) -> tuple:
+    """One-permutation MinHash: each item's 64-bit hash picks a bin and competes for its minimum.
+
+    Empty bins borrow from the next non-empty bin (rotation densification), so two
+    signatures can be compared position by position like classic MinHash.
+    """
+    bins = [MAX_HASH] * NUM_PERM
+    for item in items:
+        h = _hash64(item)
+        b = h % NUM_PERM
+        v = h // NUM_PERM
+        if v < bins[b]:
+            bins[b] = v
+    if all(v == MAX_HASH for v in bins):
+        return (EMPTY_BIN,) * NUM_PERM
+    out = []
+    for i in range(NUM_PERM):
+        j, offset = i, 0
+        while bins[j] == MAX_HASH:
+            j = (j + 1) % NUM_PERM
+            offset += 1
+        out.append((bins[j] + offset * 0x9E3779B1) & 0xFFFFFFFE)  # never EMPTY_BIN
+    return tuple(out)
+
+
+def pack(signature) -> bytes:
+    return struct.pack(f">{NUM_PERM}I", *signature)
+
+
+def unpack(blob: bytes) -> tuple:
+    return struct.unpack(f">{NUM_PERM}I", blob)
+
+
+def similarity(a, b) -> float:
+    """Estimated Jaccard similarity of the shingle sets behind two signatures."""
+    return sum(x == y for x, y in zip(a, b)) / NUM_PERM
+
+
+def band_keys(signature):
+    """One signed 63-bit key per band (fits a BIGINT column)."""
+    keys = []
+    for band in range(BANDS):
+        values = signature[band * ROWS:(band + 1) * ROWS]
+        raw = hashlib.blake2b(struct.pack(f">B{ROWS}I", band, *values), digest_size=8).digest()
+        keys.append(int.from_bytes(raw, "big") >> 1)
+    return keys
+
+
+class Fingerprint:
+    def __init__(self, body: str, link: str | None = None):
+        text = normalize_text(body)
+        link = link or first_link(body)
+        self.link_hash = digest(normalize_link(link)) if link else None
+        self.body_hash = digest(text) if text else None
+        self.signature = minhash(shingles(text)) if text else None
+        self.bands = band_keys(self.signature) if self.signature else []
+
+    def columns(self):
+        """Values for the Post fingerprint columns."""
+        return {
+            "link_hash": self.link_hash,
+            "body_hash": self.body_hash,
+            "minhash": pack(self.signature) if self.signature else None,
+        }
+
+
+# ---------- lookup ----------
+def find_duplicates_many(fps, now: datetime | None = None, limit: int = 5):
+    """For each Fingerprint, the posts queued within the window that share its link or body, or look like it.
+
+    One query per kind for the whole batch. Returns a list (aligned with `fps`) of
+    [{"post_id", "kind": "link" | "body" | "near", "similarity"}], best first.
+    """
+    s = settings()
+    since = (now or datetime.utcnow()) - timedelta(days=float(s["window_days"]))
+    threshold = float(s["threshold"])
+    found = [{} for _ in fps]
+    for kind, column, attr in (("link", Post.link_hash, "link_hash"), ("body", Post.body_hash, "body_hash")):
+        wanted = defaultdict(list)
+        for i, fp in enumerate(fps):
+            if getattr(fp, attr):
+                wanted[getattr(fp, attr)].append(i)
+        for values in chunked(list(wanted), LOOKUP_CHUNK):
+            for post_id, value in db.session.execute(
+                sa.select(Post.id, column).where(column.in_(values), Post.created_at >= since)
+            ):
+                for i in wanted[value]:
+                    found[i].setdefault(post_id, {"post_id": post_id, "kind": kind, "similarity": 1.0})
+
+    by_band = defaultdict(list)
+    for i, fp in enumerate(fps):
+        for key in fp.bands:
+            by_band[key].append(i)
+    candidates = defaultdict(set)
+    for keys in chunked(list(by_band), LOOKUP_CHUNK):
+        for post_id, key in db.session.execute(
+            sa.select(PostSignatureBand.post_id, PostSignatureBand.band_key)
+            .where(PostSignatureBand.band_key.in_(keys), PostSignatureBand.created_at >= since)
+            .order_by(PostSignatureBand.created_at.desc())
+            .limit(MAX_CANDIDATES * len(keys))
+        ):
+            for i in by_band[key]:
+                if post_id not in found[i] and len(candidates[i]) < MAX_CANDIDATES:
+                    candidates[i].add(post_id)
+    signatures = {}
+    for ids in chunked(list(set().union(*candidates.values())), LOOKUP_CHUNK):
+        for post_id, blob in db.session.execute(
+            sa.select(Post.id, Post.minhash).where(Post.id.in_(ids), Post.minhash.isnot(None))
+        ):
+            signatures[post_id] = unpack(blob)
+    for i, post_ids in candidates.items():
+        for post_id in post_ids & signatures.keys():
+            score = similarity(fps[i].signature, signatures[post_id])
+            if score >= threshold:
+                found[i][post_id] = {"post_id": post_id, "kind": "near", "similarity": round(score, 3)}
+    return [sorted(f.values(), key=lambda d: (-d["similarity"], -d["post_id"]))[:limit] for f in found]
+
+
+def find_duplicates(fp: Fingerprint, now: datetime | None = None, limit: int = 5):
+    return find_duplicates_many([fp], now, limit)[0]
+
+
+def index(rows):
+    """Add band rows for [(post_id, Fingerprint, created_at), ...]; the caller commits."""
+    values = [
+        {"post_id": post_id, "band": band, "band_key": key, "created_at": created_at}
+        for post_id, fp, created_at in rows
+        for band, key in enumerate(fp.bands)
+    ]
+    if values:
+        db.session.execute(sa.insert(PostSignatureBand), values)
+
+
+class BatchIndex:
+    """In-memory counterpart of the stored index, for duplicates inside one import."""
+
+    def __init__(self):
+        self.hashes = {}
+        self.buckets = defaultdict(list)
+        self.threshold = float(settings()["threshold"])
+
+    def find(self, fp: Fingerprint):
+        for kind, value in (("link", fp.link_hash), ("body", fp.body_hash)):
+            if value and (kind, value) in self.hashes:
+                return {"ref": self.hashes[(kind, value)], "kind": kind, "similarity": 1.0}
+        seen = set()
+        for key in fp.bands:
+            for ref, signature in self.buckets[key][-MAX_CANDIDATES:]:
+                if ref in seen:
+                    continue
+                seen.add(ref)
+                score = similarity(fp.signature, signature)
+                if score >= self.threshold:
+                    return {"ref": ref, "kind": "near", "similarity": round(score, 3)}
+        return None
+
+    def add(self, ref, fp: Fingerprint):
+        for kind, value in (("link", fp.link_hash), ("body", fp.body_hash)):
+            if value:
+                self.hashes.setdefault((kind, value), ref)
+        for key in fp.bands:
+            self.buckets[key].append((ref, fp.signature))
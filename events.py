@@ -0,0 +1,150 @@
+# events.py
+"""Pub/sub for the live dashboard (/api/stream).
+
+Publishers add a StreamEvent row inside their own transaction (publish / publish_many),
+so an event exists exactly when the change it describes was committed. The table is the
+broker stand-in shared by every gunicorn worker and the scheduler: each process runs one
+relay thread that polls it for new rows and fans them out to that process's subscribers.
+Database load is one indexed query per process per EVENT_POLL_SECONDS, however many
+dashboards are connected.
+
+Ids are handed out when rows are inserted, not when they commit, so with concurrent
+writers a lower id can become visible after a higher one was relayed. The relay remembers
+the ids it skipped over and asks for them again on every poll until they show up or
+GAP_SECONDS pass (a rolled-back insert leaves a hole for good).
+"""
+import json
+import os
+import queue
+import threading
+import time
+import traceback
+from datetime import datetime, timedelta
+
+import sqlalchemy as sa
+
+import instrumentation
+from models import StreamEvent, db
+
+POLL_SECONDS = float(os.getenv("EVENT_POLL_SECONDS", 1))
+RETENTION_SECONDS = int(os.getenv("EVENT_RETENTION_SECONDS", 600))  # how far back Last-Event-ID can replay
+SUBSCRIBER_QUEUE_SIZE = 1000
+RELAY_BATCH = 500
+GAP_SECONDS = float(os.getenv("EVENT_GAP_SECONDS", 30))  # how long a skipped id is waited for
+MAX_GAP_IDS = 1000  # a larger jump (sequence cache, mass rollback) is not tracked id by id
+
+
+def event_row(kind: str, data: dict) -> dict:
+    return {"kind": kind, "payload": json.dumps(data, default=str), "created_at": datetime.utcnow()}
+
+
+def publish(kind: str, data: dict):
+    """Queue an event on the current session; it is delivered once the caller commits."""
+    db.session.add(StreamEvent(**event_row(kind, data)))
+
+
+def publish_many(rows: list[dict]):
+    """executemany variant of publish() for rows built with event_row()."""
+    if rows:
+        db.session.execute(sa.insert(StreamEvent), rows)
+
+
+def recent_events(after_id: int, limit: int = RELAY_BATCH, also_ids=()):
+    """Events after `after_id`, plus any of `also_ids` (late commits behind it), in id order."""
+    newer = StreamEvent.id > after_id
+    rows = db.session.execute(
+        sa.select(StreamEvent.id, StreamEvent.kind, StreamEvent.payload)
+        .where(sa.or_(newer, StreamEvent.id.in_(list(also_ids))) if also_ids else newer)
+        .order_by(StreamEvent.id)
+        .limit(limit)
+    ).all()
+    return [(r.id, r.kind, r.payload) for r in rows]
+
+
+class Subscription:
+    def __init__(self):
+        self.queue = queue.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self.closed = False  # set when the client fell too far behind; it reconnects and replays
+
+    def get(self, timeout: float):
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class EventBus:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.subscribers = set()
+        self.thread = None
+        self.last_id = None
+        self.gaps = {}  # id skipped over -> monotonic time it was noticed
+
+    def start(self, flask_app):
+        """Start this process's relay thread (idempotent)."""
+        with self.lock:
+            if self.thread is not None and self.thread.is_alive():
+                return
+            self.thread = threading.Thread(target=self._relay, args=(flask_app,), name="event-relay", daemon=True)
+            self.thread.start()
+
+    def subscribe(self) -> Subscription:
+        sub = Subscription()
+        with self.lock:
+            self.subscribers.add(sub)
+        return sub
+
+    def unsubscribe(self, sub: Subscription):
+        with self.lock:
+            self.subscribers.discard(sub)
+
+    def dispatch(self, events):
+        with self.lock:
+            subscribers = list(self.subscribers)
+        for sub in subscribers:
+            for event in events:
+                try:
+                    sub.queue.put_nowait(event)
+                except queue.Full:
+                    sub.closed = True
+                    self.unsubscribe(sub)
+                    break
+
+    def track_gaps(self, ids):
+        """Advance last_id over `ids` (ascending), remembering the ids skipped and forgetting old ones."""
+        now = time.monotonic()
+        for event_id in ids:
+            self.gaps.pop(event_id, None)
+            if event_id > self.last_id:
+                if event_id - self.last_id - 1 <= MAX_GAP_IDS:
+                    self.gaps.update(dict.fromkeys(range(self.last_id + 1, event_id), now))
+                self.last_id = event_id
+        self.gaps = {i: t for i, t in self.gaps.items() if now - t < GAP_SECONDS}
+
+    def _relay(self, flask_app):
+        pruned_at = 0.0
+        while True:
+            try:
+                with flask_app.app_context():
+                    if self.last_id is None:
+                        self.last_id = db.session.scalar(sa.select(sa.func.max(StreamEvent.id))) or 0
+                    events = recent_events(self.last_id, also_ids=self.gaps)
+                    if events:
+                        self.track_gaps([event_id for event_id, _, _ in events])
+                        self.dispatch(events)
+                    if time.monotonic() - pruned_at > 60:
+                        cutoff = datetime.utcnow() - timedelta(seconds=RETENTION_SECONDS)
+                        db.session.execute(sa.delete(StreamEvent).where(StreamEvent.created_at < cutoff))
+                        db.session.commit()
+                        pruned_at = time.monotonic()
+                if len(events) == RELAY_BATCH:
+                    continue
+            except Exception:
+                instrumentation.JOB_ERRORS.inc(job="event_relay")
+                print("Error in event relay:")
+                traceback.print_exc()
+            time.sleep(POLL_SECONDS)
+
+
+bus = EventBus()
@@ -0,0 +1,29 @@
+# gunicorn.conf.py — picked up automatically by `gunicorn app:app`
+import os
+
+# Background jobs belong to the dedicated worker (auto_scheduler.py); set RUN_SCHEDULER=true
+# only for a single-process deployment without one.
+RUN_SCHEDULER = os.environ.get("RUN_SCHEDULER", "false").lower() == "true"
+
+# Each open dashboard holds an /api/stream connection; threaded workers keep those from
+# tying up a whole worker process each.
+worker_class = os.environ.get("GUNICORN_WORKER_CLASS", "gthread")
+threads = int(os.environ.get("GUNICORN_THREADS", 16))
+
+
+def on_starting(server):
+    # Create/upgrade the schema once in the master instead of on every worker import.
+    from app import app, ensure_schema
+    from models import db
+
+    with app.app_context():
+        ensure_schema()
+        # Workers are forked from here: don't hand them the master's pooled connection.
+        db.engine.dispose()
+
+
+def post_worker_init(worker):
+    if RUN_SCHEDULER:
+        from app import app, start_scheduler
+
+        app.extensions["scheduler"] = start_scheduler(app)
@@ -0,0 +1,75 @@
+# heartbeat.py
+"""Heartbeats for background worker processes.
+
+Every scheduler process upserts its WorkerHeartbeat row every HEARTBEAT_SECONDS. A worker
+is alive while its last beat is newer than STALE_AFTER. Jobs that must run once per
+deployment rather than once per process (analytics, rollups, affiliate polling) only
+run on the leader: the longest-running alive worker. Publishing itself is safe on every
+worker because posts are claimed. Must run inside a Flask app context.
+"""
+import json
+import os
+import socket
+from datetime import datetime, timedelta
+
+import sqlalchemy as sa
+
+from models import WorkerHeartbeat, db
+
+INTERVAL_SECONDS = float(os.getenv("HEARTBEAT_SECONDS", 15))
+STALE_AFTER = timedelta(seconds=3 * INTERVAL_SECONDS)
+_started = {}  # pid -> first use in that process; forked gunicorn workers must not inherit the master's id
+
+
+def worker_id() -> str:
+    """host:pid of the calling process (resolved per call, so it is right after a fork)."""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def started_at() -> datetime:
+    return _started.setdefault(os.getpid(), datetime.utcnow())
+
+
+def beat(role: str = "scheduler", info: dict | None = None):
+    now = datetime.utcnow()
+    me = worker_id()
+    row = db.session.get(WorkerHeartbeat, me)
+    if row is None:
+        row = WorkerHeartbeat(worker_id=me, role=role, started_at=started_at())
+        db.session.add(row)
+    row.beat_at = now
+    row.info = json.dumps(info or {}, default=str)
+    # forget workers that have been gone for a day
+    db.session.execute(sa.delete(WorkerHeartbeat).where(WorkerHeartbeat.beat_at < now - timedelta(days=1)))
+    db.session.commit()
+
+
+def alive(now: datetime | None = None):
+    now = now or datetime.utcnow()
+    return db.session.scalars(
+        sa.select(WorkerHeartbeat)
+        .where(WorkerHeartbeat.beat_at >= now - STALE_AFTER)
+        .order_by(WorkerHeartbeat.started_at, WorkerHeartbeat.worker_id)
+    ).all()
+
+
+def is_leader() -> bool:
+    workers = alive()
+    return not workers or workers[0].worker_id == worker_id()
+
+
+def status():
+    now = datetime.utcnow()
+    rows = db.session.scalars(sa.select(WorkerHeartbeat).order_by(WorkerHeartbeat.started_at)).all()
+    return [
+        {
+            "worker_id": r.worker_id,
+            "role": r.role,
+            "started_at": r.started_at.isoformat(),
+            "beat_at": r.beat_at.isoformat(),
+            "seconds_since_beat": round((now - r.beat_at).total_seconds(), 1),
+            "alive": now - r.beat_at <= STALE_AFTER,
+            "info": json.loads(r.info) if r.info else {},
+        }
+        for r in rows
+    ]
@@ -0,0 +1,81 @@
+# http_client.py
+"""Shared outbound HTTP layer.
+
+One pooled, keep-alive requests.Session per upstream host (graph.facebook.com,
+api.publer.io, api.awin.com, api.rakutenmarketing.com, ...), so repeated calls reuse
+TCP+TLS connections instead of handshaking every time. Every call gets a timeout.
+requests itself is imported on first use to keep worker boot cheap.
+"""
+import os
+import threading
+from collections import Counter
+from urllib.parse import urlsplit
+
+import instrumentation
+
+CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", 5))
+READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", 15))
+POOL_MAXSIZE = int(os.getenv("HTTP_POOL_MAXSIZE", 20))  # keep-alive connections kept per host
+
+_sessions = {}
+_requests_sent = Counter()
+_lock = threading.Lock()
+
+
+def get_session(host: str):
+    """Return the shared Session for `host`, creating it on first use."""
+    s = _sessions.get(host)
+    if s is not None:
+        return s
+    with _lock:
+        s = _sessions.get(host)
+        if s is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+
+            s = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=POOL_MAXSIZE, pool_block=False)
+            s.mount("https://", adapter)
+            s.mount("http://", adapter)
+            _sessions[host] = s
+    return s
+
+
+def request(method: str, url: str, **kwargs):
+    host = urlsplit(url).hostname or ""
+    kwargs.setdefault("timeout", (CONNECT_TIMEOUT, READ_TIMEOUT))
+    with _lock:
+        _requests_sent[host] += 1
+    with instrumentation.HTTP_LATENCY.time(host=host):
+        return get_session(host).request(method, url, **kwargs)
+
+
+def get(url: str, **kwargs):
+    return request("GET", url, **kwargs)
+
+
+def post(url: str, **kwargs):
+    return request("POST", url, **kwargs)
+
+
+def stats():
+    """Per-host request and connection counters. reused = requests that did not open a new connection."""
+    out = {}
+    with _lock:
+        sessions = dict(_sessions)
+        sent = dict(_requests_sent)
+    for host, s in sessions.items():
+        opened = 0
+        for adapter in {id(a): a for a in s.adapters.values()}.values():
+            pools = adapter.poolmanager.pools
+            for key in pools.keys():
+                pool = pools.get(key)
+                if pool is not None:
+                    opened += pool.num_connections
+        requests_sent = sent.get(host, 0)
+        out[host] = {
+            "requests": requests_sent,
+            "connections_opened": opened,
+            "connections_reused": max(requests_sent - opened, 0),
+        }
+    return out
@@ -0,0 +1,156 @@
+# instrumentation.py
+"""In-process timing histograms and counters, rendered in Prometheus text format.
+
+Hot paths wrap themselves in `HISTOGRAM.time(label=...)`; counters count outcomes and
+job errors. Each process keeps its own registry: the background worker ships a snapshot
+with every heartbeat, and /metrics renders the serving process's registry plus every
+alive worker's snapshot, each labelled with its worker id, next to queue gauges read from
+the database at scrape time. No client library needed.
+"""
+import threading
+import time
+from contextlib import contextmanager
+
+import sqlalchemy as sa
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+REGISTRY = {}
+
+
+class Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.series = {}
+        self.lock = threading.Lock()
+        REGISTRY[name] = self
+
+    def _key(self, labels: dict):
+        return tuple(str(labels.get(n, "")) for n in self.labelnames)
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.series[key] = self.series.get(key, 0) + amount
+
+    def snapshot(self):
+        with self.lock:
+            return [[list(k), v] for k, v in self.series.items()]
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def observe(self, seconds: float, **labels):
+        key = self._key(labels)
+        with self.lock:
+            s = self.series.get(key)
+            if s is None:
+                s = self.series[key] = {"buckets": [0] * len(BUCKETS), "sum": 0.0, "count": 0}
+            for i, bound in enumerate(BUCKETS):
+                if seconds <= bound:
+                    s["buckets"][i] += 1
+            s["sum"] += seconds
+            s["count"] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def snapshot(self):
+        with self.lock:
+            return [[list(k), {"buckets": list(s["buckets"]), "sum": s["sum"], "count": s["count"]}] for k, s in self.series.items()]
+
+
+def quantile(series: dict, q: float):
+    """Approximate quantile from cumulative bucket counts: the upper bound of the bucket it falls in, capped at the last bucket."""
+    if not series["count"]:
+        return None
+    rank = q * series["count"]
+    for bound, n in zip(BUCKETS, series["buckets"]):
+        if n >= rank:
+            return bound
+    return BUCKETS[-1]
+
+
+PLATFORM_LATENCY = Histogram("platform_post_seconds", "Time spent in one post_to_* call.", ["platform"])
+PLATFORM_RESULTS = Counter("platform_post_total", "post_to_* results by outcome.", ["platform", "outcome"])
+HTTP_LATENCY = Histogram("http_request_seconds", "Outbound HTTP request time (Graph, Publer, Awin, Rakuten, ...).", ["host"])
+DB_COMMIT = Histogram("db_commit_seconds", "Commit time at instrumented call sites.", ["site"])
+DB_STATEMENT = Histogram("db_statement_seconds", "SQL statement execution time.", ["statement"])
+DB_QUERY = Histogram("db_query_seconds", "Time spent in named queue/bookkeeping queries.", ["query"])
+JOB_DURATION = Histogram("job_seconds", "Background job / tick duration.", ["job"])
+JOB_ERRORS = Counter("job_errors_total", "Background job failures.", ["job"])
+TICK_OVERRUNS = Counter("publish_tick_overruns_total", "Publish ticks that hit PUBLISH_TICK_BUDGET_SECONDS with posts still due.")
+MEDIA_MISSING = Counter("media_missing_total", "Posts deferred because their upload is not on this process's UPLOAD_FOLDER.")
+AFFILIATE_POLL = Histogram("affiliate_poll_seconds", "Time to ingest one affiliate network.", ["network"])
+
+
+# ---------- SQL statement timing ----------
+def _before_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+def _after_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.get("query_start")
+    if started:
+        verb = statement.lstrip().split(None, 1)[0].lower() if statement.strip() else "other"
+        DB_STATEMENT.observe(time.perf_counter() - started.pop(), statement=verb)
+
+
+def instrument_sql():
+    """Time every statement on every engine (idempotent)."""
+    if not sa.event.contains(sa.engine.Engine, "before_cursor_execute", _before_execute):
+        sa.event.listen(sa.engine.Engine, "before_cursor_execute", _before_execute)
+        sa.event.listen(sa.engine.Engine, "after_cursor_execute", _after_execute)
+
+
+# ---------- export ----------
+def snapshot():
+    return {name: {"kind": m.kind, "help": m.help, "labels": list(m.labelnames), "series": m.snapshot()} for name, m in REGISTRY.items()}
+
+
+def _labels(names, values, extra):
+    pairs = [(n, v) for n, v in zip(names, values)] + list(extra.items())
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{n}="{v}"' for (n, _), v in zip(pairs, escaped)) + "}"
+
+
+def render(snapshots: dict, gauges=()):
+    """Prometheus text exposition. `snapshots` maps worker id -> snapshot(); `gauges` is [(name, help, value)]."""
+    out = []
+    for name, help, value in gauges:
+        out += [f"# HELP {name} {help}", f"# TYPE {name} gauge", f"{name} {value}"]
+    names = sorted({n for snap in snapshots.values() for n in snap})
+    for name in names:
+        first = next(snap[name] for snap in snapshots.values() if name in snap)
+        out += [f"# HELP {name} {first['help']}", f"# TYPE {name} {first['kind']}"]
+        for worker, snap in snapshots.items():
+            metric = snap.get(name)
+            if not metric:
+                continue
+            extra = {"worker": worker}
+            for values, data in metric["series"]:
+                if metric["kind"] == "counter":
+                    out.append(f"{name}{_labels(metric['labels'], values, extra)} {data}")
+                    continue
+                for bound, n in zip(BUCKETS, data["buckets"]):
+                    out.append(f"{name}_bucket{_labels(metric['labels'] + ['le'], values + [bound], extra)} {n}")
+                out.append(f"{name}_bucket{_labels(metric['labels'] + ['le'], values + ['+Inf'], extra)} {data['count']}")
+                out.append(f"{name}_sum{_labels(metric['labels'], values, extra)} {data['sum']}")
+                out.append(f"{name}_count{_labels(metric['labels'], values, extra)} {data['count']}")
+    return "\n".join(out) + "\n"
@@ -0,0 +1,83 @@
+# media.py
+"""Content-addressed media storage for post uploads.
+
+Uploads are copied to disk in CHUNK_SIZE pieces while being hashed, then renamed to
+`<sha256>.<ext>`; a file whose content is already stored is discarded, so duplicates cost
+no extra space. Stored names never change content, which is what lets /upload/<name>
+be served as immutable. Posters get a MediaFile and read it through open() or
+iter_chunks(), never as one bytes object.
+"""
+import hashlib
+import mimetypes
+import os
+import re
+import uuid
+
+CHUNK_SIZE = 1024 * 1024
+CONTENT_ADDRESSED = re.compile(r"^[0-9a-f]{64}\.[a-z0-9]+$")
+VIDEO_EXTENSIONS = {"mp4", "mov"}
+
+
+def extension(filename: str) -> str:
+    return filename.rsplit(".", 1)[1].lower() if "." in filename else ""
+
+
+def is_content_addressed(filename: str) -> bool:
+    return bool(CONTENT_ADDRESSED.match(filename))
+
+
+def store_upload(stream, original_filename: str, folder: str) -> str:
+    """Copy `stream` into `folder` chunk by chunk and return its content-addressed filename."""
+    os.makedirs(folder, exist_ok=True)
+    digest = hashlib.sha256()
+    tmp_path = os.path.join(folder, f".upload-{uuid.uuid4().hex}.tmp")
+    try:
+        with open(tmp_path, "wb") as out:
+            while True:
+                chunk = stream.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                out.write(chunk)
+        filename = f"{digest.hexdigest()}.{extension(original_filename)}"
+        path = os.path.join(folder, filename)
+        if os.path.exists(path):
+            os.remove(tmp_path)  # same bytes already stored
+        else:
+            os.replace(tmp_path, path)
+        return filename
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+class MediaFile:
+    """A stored upload handed to platform posters."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.filename = os.path.basename(path)
+        self.mimetype = mimetypes.guess_type(self.filename)[0] or "application/octet-stream"
+
+    @property
+    def size(self) -> int:
+        return os.path.getsize(self.path)
+
+    @property
+    def is_video(self) -> bool:
+        return extension(self.filename) in VIDEO_EXTENSIONS
+
+    def open(self):
+        return open(self.path, "rb")
+
+    def iter_chunks(self, chunk_size: int = CHUNK_SIZE):
+        with self.open() as f:
+            while True:
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    return
+                yield chunk
+
+    def __repr__(self):
+        return f"MediaFile({self.filename!r})"
@@ -0,0 +1,175 @@
+# models.py
+"""SQLAlchemy models. `db` is bound to the Flask app in app.create_app()."""
+from datetime import datetime
+
+import sqlalchemy as sa
+from flask_sqlalchemy import SQLAlchemy
+
+db = SQLAlchemy()
+
+
+class Analytics(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    metric_name = db.Column(db.String(100))
+    metric_value = db.Column(db.String(255))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+
+
+class Post(db.Model):
+    __table_args__ = (
+        db.Index("ix_post_status_scheduled_for", "status", "scheduled_for"),
+        db.Index("ix_post_status_lease_expires_at", "status", "lease_expires_at"),
+        db.Index("ux_post_link", "link", unique=True),
+        # keyset pagination of /posts (see post_listing.py)
+        db.Index("ix_post_created_at_id", "created_at", "id"),
+        db.Index("ix_post_status_created_at_id", "status", "created_at", "id"),
+        # exact-duplicate lookups within the dedup window (see dedup.py)
+        db.Index("ix_post_body_hash_created_at", "body_hash", "created_at"),
+        db.Index("ix_post_link_hash_created_at", "link_hash", "created_at"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    title = db.Column(db.String(200))
+    body = db.Column(db.Text)
+    image_filename = db.Column(db.String(300), nullable=True)
+    platforms = db.Column(db.String(200))  # CSV: instagram,facebook,x,tiktok
+    scheduled_for = db.Column(db.DateTime, nullable=True, index=True)  # None = not planned yet (see send_schedule.py)
+    status = db.Column(db.String(50), default="pending")  # pending, processing, posted, failed
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    result_log = db.Column(db.Text, nullable=True)  # legacy; see PostLogEntry / `flask migrate-result-log`
+    claimed_by = db.Column(db.String(100), nullable=True)  # claim token of the worker publishing it
+    lease_expires_at = db.Column(db.DateTime, nullable=True)  # 'processing' rows past this are reclaimable
+    link = db.Column(db.String(1000), nullable=True)  # affiliate link; bulk imports skip links already queued
+    image_url = db.Column(db.String(1000), nullable=True)  # remote image from the offer catalogue
+    link_hash = db.Column(db.String(32), nullable=True)  # dedup fingerprint: normalized link
+    body_hash = db.Column(db.String(32), nullable=True)  # dedup fingerprint: normalized body
+    minhash = db.Column(db.LargeBinary, nullable=True)  # dedup fingerprint: MinHash signature of the body
+
+
+class PostSignatureBand(db.Model):
+    """LSH bands of Post.minhash: posts sharing a band_key are near-duplicate candidates."""
+    __table_args__ = (db.Index("ix_post_signature_band_key_created_at", "band_key", "created_at"),)
+
+    post_id = db.Column(db.Integer, db.ForeignKey("post.id", ondelete="CASCADE"), primary_key=True)
+    band = db.Column(db.SmallInteger, primary_key=True, autoincrement=False)
+    band_key = db.Column(db.BigInteger, nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False)  # copy of Post.created_at, so lookups stay on the index
+
+
+class PostLogEntry(db.Model):
+    """Append-only delivery log: one row per log line, tagged with platform and attempt."""
+    __table_args__ = (
+        db.Index("ix_post_log_entry_post_id_id", "post_id", "id"),
+        db.Index("ix_post_log_entry_created_at", "created_at"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    post_id = db.Column(db.Integer, db.ForeignKey("post.id", ondelete="CASCADE"), nullable=False)
+    platform = db.Column(db.String(50), nullable=True)  # None for post-level lines
+    attempt = db.Column(db.Integer, nullable=False, default=1)
+    ok = db.Column(db.Boolean, nullable=True)
+    message = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def render(self):
+        text = f"platform={self.platform} -> {self.message}" if self.platform else self.message
+        return f"[{self.created_at.isoformat()}] {text}"
+
+
+class PostDelivery(db.Model):
+    """Delivery state of one post on one platform. Only pending/retrying rows are (re)sent."""
+    __table_args__ = (db.UniqueConstraint("post_id", "platform", name="uq_post_delivery_post_platform"),)
+
+    id = db.Column(db.Integer, primary_key=True)
+    post_id = db.Column(db.Integer, db.ForeignKey("post.id", ondelete="CASCADE"), nullable=False)
+    platform = db.Column(db.String(50), nullable=False)
+    status = db.Column(db.String(20), default="pending")  # pending, retrying, posted, failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime, nullable=True)
+    last_error = db.Column(db.Text, nullable=True)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+class AffiliateTransaction(db.Model):
+    """Approved affiliate transactions already ingested; the unique key is what dedupes re-fetches."""
+    __table_args__ = (
+        db.UniqueConstraint("network", "transaction_id", name="uq_affiliate_transaction_network_txid"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    network = db.Column(db.String(50), nullable=False)
+    transaction_id = db.Column(db.String(100), nullable=False)
+    occurred_at = db.Column(db.DateTime, nullable=True)
+    link = db.Column(db.String(1000), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+class IngestionCursor(db.Model):
+    """High-water mark per affiliate network: the next poll only asks for data after it."""
+    network = db.Column(db.String(50), primary_key=True)
+    high_water_mark = db.Column(db.DateTime, nullable=True)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+class MetricSample(db.Model):
+    """Raw numeric sample of a metric; rolled up into MetricRollup by timeseries.rollup()."""
+    __table_args__ = (db.Index("ix_metric_sample_metric_name_ts", "metric_name", "ts"),)
+
+    id = db.Column(db.Integer, primary_key=True)
+    metric_name = db.Column(db.String(100), nullable=False)
+    ts = db.Column(db.DateTime, nullable=False, index=True)
+    value = db.Column(db.Float, nullable=False)
+
+
+class MetricRollup(db.Model):
+    """Hourly / daily aggregate of MetricSample values for one metric."""
+    __table_args__ = (
+        db.UniqueConstraint("metric_name", "step", "bucket", name="uq_metric_rollup_metric_step_bucket"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    metric_name = db.Column(db.String(100), nullable=False)
+    step = db.Column(db.String(10), nullable=False)  # hour, day
+    bucket = db.Column(db.DateTime, nullable=False)  # start of the hour / day (UTC)
+    count = db.Column(db.Integer, nullable=False)
+    total = db.Column(db.Float, nullable=False)
+    min = db.Column(db.Float, nullable=False)
+    max = db.Column(db.Float, nullable=False)
+    last = db.Column(db.Float, nullable=False)
+    last_ts = db.Column(db.DateTime, nullable=False)
+
+
+class StreamEvent(db.Model):
+    """Outbox of dashboard events; every process relays new rows to its /api/stream clients."""
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(30), nullable=False)  # analytics, post
+    payload = db.Column(db.Text, nullable=False)  # JSON
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+
+
+class WorkerHeartbeat(db.Model):
+    """Last sign of life from each background worker process (see heartbeat.py)."""
+    worker_id = db.Column(db.String(100), primary_key=True)  # host:pid
+    role = db.Column(db.String(30), nullable=False, default="scheduler")
+    started_at = db.Column(db.DateTime, nullable=False)
+    beat_at = db.Column(db.DateTime, nullable=False, index=True)
+    info = db.Column(db.Text, nullable=True)  # JSON: jobs, next due post, ...
+
+
+def ensure_schema():
+    """create_all() plus additive upgrades: new columns and indexes on tables that already exist."""
+    db.create_all()
+    inspector = sa.inspect(db.engine)
+    preparer = db.engine.dialect.identifier_preparer
+    for table in db.metadata.sorted_tables:
+        existing = {c["name"] for c in inspector.get_columns(table.name)}
+        missing = [c for c in table.columns if c.name not in existing]
+        if missing:
+            with db.engine.begin() as conn:
+                for column in missing:
+                    ddl = sa.schema.CreateColumn(column).compile(dialect=db.engine.dialect)
+                    conn.execute(sa.text(f"ALTER TABLE {preparer.format_table(table)} ADD COLUMN {ddl}"))
+        indexes = {i["name"] for i in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in indexes:
+                index.create(db.engine)
@@ -0,0 +1,158 @@
+# post_import.py
+"""Bulk creation of queued Posts from JSON objects or posts.csv rows.
+
+Rows are validated one by one, then written CHUNK_SIZE at a time with a single
+executemany INSERT and one commit per chunk, so memory stays bounded by the chunk and
+a CSV can be streamed straight from a file or request body. `link` is the idempotency
+key: rows whose link is already queued (or repeated earlier in the same import) are
+counted as duplicates, not inserted again. Rows are also fingerprinted (dedup.py): with
+dedup action "skip", rows whose link/body matches or closely resembles a post queued
+within the dedup window, or an earlier row of the same import, are not inserted and
+are listed under "matches" (with post_id, or same_as_row for an earlier row); with
+"warn" they are inserted and still listed.
+Must run inside a Flask app context.
+"""
+import os
+from datetime import datetime, timezone
+
+import sqlalchemy as sa
+
+import dedup
+from batching import chunked
+from models import Post, db
+
+CHUNK_SIZE = int(os.getenv("POST_IMPORT_CHUNK_SIZE", 500))
+MAX_REPORTED_ERRORS = 1000
+LINK_MAX_LENGTH = 1000
+
+
+PLATFORM_ALIASES = {"twitter": "x"}  # alternate name -> platform it is published and rate-limited as
+
+
+def split_platforms(value):
+    """Canonical platform names from a CSV string or list, aliases folded and repeats dropped, in order.
+
+    Every platform appears once, so a post gets exactly one PostDelivery per network:
+
+    >>> split_platforms("Facebook, facebook,")
+    ['facebook']
+    >>> split_platforms("x,twitter,tiktok")
+    ['x', 'tiktok']
+    """
+    if isinstance(value, (list, tuple)):
+        items = value
+    else:
+        items = str(value or "").split(",")
+    names = (str(p).strip().lower() for p in items if str(p).strip())
+    return list(dict.fromkeys(PLATFORM_ALIASES.get(p, p) for p in names))
+
+
+def parse_when(value):
+    if not value:
+        return None
+    ts = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    return ts.astimezone(timezone.utc).replace(tzinfo=None) if ts.tzinfo else ts
+
+
+def normalize(row: dict, known_platforms):
+    """Post column values for one JSON object / CSV row; raises ValueError with the reason."""
+    if not isinstance(row, dict):
+        raise ValueError("row must be an object")
+    link = str(row.get("link") or "").strip()
+    if not link:
+        raise ValueError("link is required")
+    if len(link) > LINK_MAX_LENGTH:
+        raise ValueError(f"link longer than {LINK_MAX_LENGTH} characters")
+    body = str(row.get("body") or row.get("post_text") or "").replace("[Link]", link).strip()
+    if not body:
+        raise ValueError("body/post_text is required")
+    platforms = split_platforms(row.get("platforms", row.get("platform")))
+    if not platforms:
+        raise ValueError("at least one platform is required")
+    unknown = [p for p in platforms if p not in known_platforms]
+    if unknown:
+        raise ValueError(f"unknown platform(s): {', '.join(unknown)}")
+    try:
+        scheduled_for = parse_when(row.get("scheduled_for"))
+    except ValueError:
+        raise ValueError("scheduled_for must be an ISO-8601 timestamp")
+    return {
+        "title": (str(row.get("title") or "").strip() or None),
+        "body": body,
+        "link": link,
+        "image_url": (str(row.get("image_url") or "").strip() or None),
+        "platforms": ",".join(platforms),
+        "scheduled_for": scheduled_for,
+        "status": "pending",
+        "created_at": datetime.utcnow(),
+    }
+
+
+def _insert_new(values: list[dict], fingerprints: list):
+    """Insert the rows whose link is not queued yet, with their dedup bands; returns how many were inserted."""
+    known = set(db.session.scalars(sa.select(Post.link).where(Post.link.in_([v["link"] for v in values]))))
+    new = [(v, fp) for v, fp in zip(values, fingerprints) if v["link"] not in known]
+    if new:
+        ids = db.session.scalars(
+            sa.insert(Post).returning(Post.id, sort_by_parameter_order=True),
+            [v for v, _ in new],
+        ).all()
+        dedup.index([(post_id, fp, v["created_at"]) for post_id, (v, fp) in zip(ids, new)])
+    db.session.commit()
+    return len(new)
+
+
+def import_rows(rows, known_platforms, chunk_size: int = CHUNK_SIZE):
+    """Validate and insert `rows` (any iterable of dicts). Row numbers in errors are 1-based."""
+    summary = {"received": 0, "created": 0, "duplicates": 0, "failed": 0, "errors": [], "matches": []}
+    skip_matches = dedup.settings()["action"] == "skip"
+    seen = set()
+    batch = dedup.BatchIndex()
+    for chunk in chunked(enumerate(rows, start=1), chunk_size):
+        values, numbers = [], []
+        for number, row in chunk:
+            summary["received"] += 1
+            try:
+                v = normalize(row, known_platforms)
+            except ValueError as e:
+                summary["failed"] += 1
+                if len(summary["errors"]) < MAX_REPORTED_ERRORS:
+                    summary["errors"].append({"row": number, "link": row.get("link") if isinstance(row, dict) else None, "error": str(e)})
+                continue
+            if v["link"] in seen:
+                summary["duplicates"] += 1
+                continue
+            seen.add(v["link"])
+            values.append(v)
+            numbers.append(number)
+        if not values:
+            continue
+
+        fingerprints = [dedup.Fingerprint(v["body"], v["link"]) for v in values]
+        stored = dedup.find_duplicates_many(fingerprints, limit=1)
+        keep = []
+        for v, number, fp, matches in zip(values, numbers, fingerprints, stored):
+            match = matches[0] if matches else None
+            earlier = batch.find(fp)
+            if match is None and earlier is not None:
+                match = {"same_as_row": earlier["ref"], "kind": earlier["kind"], "similarity": earlier["similarity"]}
+            if match and len(summary["matches"]) < MAX_REPORTED_ERRORS:
+                summary["matches"].append({"row": number, "link": v["link"], **match})
+            if match and skip_matches:
+                summary["duplicates"] += 1
+                continue
+            batch.add(number, fp)
+            v.update(fp.columns())
+            keep.append((v, fp))
+        if not keep:
+            continue
+        values, fingerprints = [v for v, _ in keep], [fp for _, fp in keep]
+        try:
+            created = _insert_new(values, fingerprints)
+        except sa.exc.IntegrityError:
+            # another import queued some of these links between our check and insert
+            db.session.rollback()
+            created = _insert_new(values, fingerprints)
+        summary["created"] += created
+        summary["duplicates"] += len(values) - created
+    return summary
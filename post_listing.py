@@ -0,0 +1,138 @@
+# post_listing.py
+"""Keyset-paginated, column-projected Post listing for /posts, /api/posts and the dashboard.
+
+Pages are ordered newest first on (created_at, id) and addressed by an opaque cursor
+holding the last row's key, so page 1,000 costs the same index range scan as page 1
+(no OFFSET). Only the listed columns are selected: body and result_log never leave the
+database. Filters map onto indexes: status onto ix_post_status_created_at_id, the date
+range and the plain listing onto ix_post_created_at_id; the platform filter is a
+residual predicate applied while walking one of those. Must run inside a Flask app context.
+"""
+import base64
+from datetime import datetime, timedelta
+
+import sqlalchemy as sa
+
+from models import Post, db
+
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+STATUSES = ("pending", "processing", "posted", "failed")
+LIST_COLUMNS = (Post.id, Post.title, Post.platforms, Post.status, Post.scheduled_for, Post.created_at)
+
+
+def encode_cursor(row) -> str:
+    raw = f"{row.created_at.isoformat()}|{row.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(token: str):
+    """(created_at, id) from a cursor; ValueError if it is malformed."""
+    try:
+        stamp, post_id = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)).decode().split("|")
+        return datetime.fromisoformat(stamp), int(post_id)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError(f"invalid cursor: {token!r}") from e
+
+
+def parse_date(value: str | None, end: bool = False):
+    """'YYYY-MM-DD' (whole day; `end` gives the next midnight) or an ISO timestamp; None if empty."""
+    if not value:
+        return None
+    if len(value) == 10:
+        day = datetime.fromisoformat(value)
+        return day + timedelta(days=1) if end else day
+    return datetime.fromisoformat(value)
+
+
+class Filters:
+    def __init__(self, status=None, platform=None, created_from: str | None = None, created_to: str | None = None):
+        """`created_from` / `created_to` as accepted by parse_date(); `created_to` is exclusive for timestamps, inclusive for days."""
+        self.status = [s for s in (status or []) if s in STATUSES]
+        self.platform = (platform or "").strip().lower() or None
+        self.from_arg = created_from or None
+        self.to_arg = created_to or None
+        self.created_from = parse_date(self.from_arg)
+        self.created_to = parse_date(self.to_arg, end=True)
+
+    @classmethod
+    def from_args(cls, args):
+        """From query args: status (repeatable or comma separated), platform, from, to. ValueError on bad dates."""
+        statuses = [s.strip().lower() for value in args.getlist("status") for s in value.split(",") if s.strip()]
+        return cls(statuses, args.get("platform"), args.get("from"), args.get("to"))
+
+    def clauses(self):
+        where = []
+        if len(self.status) == 1:
+            where.append(Post.status == self.status[0])
+        elif self.status:
+            where.append(Post.status.in_(self.status))
+        if self.platform:
+            # platforms is a CSV column; match whole entries only
+            entries = sa.literal(",").concat(sa.func.replace(Post.platforms, " ", "")).concat(",")
+            where.append(entries.like(f"%,{self.platform},%"))
+        if self.created_from:
+            where.append(Post.created_at >= self.created_from)
+        if self.created_to:
+            where.append(Post.created_at < self.created_to)
+        return where
+
+    def args(self):
+        """Query args that reproduce these filters (for next/previous links)."""
+        out = {}
+        if self.status:
+            out["status"] = ",".join(self.status)
+        if self.platform:
+            out["platform"] = self.platform
+        if self.from_arg:
+            out["from"] = self.from_arg
+        if self.to_arg:
+            out["to"] = self.to_arg
+        return out
+
+
+def page(filters: Filters, after: str | None = None, before: str | None = None, limit: int = PAGE_SIZE):
+    """One page of rows, newest first, plus the cursors of the neighbouring pages.
+
+    `after` continues with older rows than the cursor, `before` goes back to newer ones.
+    Returns (rows, {"older": cursor or None, "newer": cursor or None}).
+    """
+    limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+    key = sa.tuple_(Post.created_at, Post.id)
+    query = sa.select(*LIST_COLUMNS).where(*filters.clauses())
+    if before:
+        query = query.where(key > sa.tuple_(*decode_cursor(before))).order_by(Post.created_at.asc(), Post.id.asc())
+    else:
+        if after:
+            query = query.where(key < sa.tuple_(*decode_cursor(after)))
+        query = query.order_by(Post.created_at.desc(), Post.id.desc())
+    rows = db.session.execute(query.limit(limit + 1)).all()
+    more = len(rows) > limit
+    rows = rows[:limit]
+    if before:
+        rows.reverse()
+    cursors = {"older": None, "newer": None}
+    if rows:
+        if more or before:
+            cursors["older"] = encode_cursor(rows[-1])
+        if after or (before and more):
+            cursors["newer"] = encode_cursor(rows[0])
+    return rows, cursors
+
+
+def latest(limit: int = 10):
+    """Newest posts for the dashboard table, projected like page()."""
+    return db.session.execute(
+        sa.select(*LIST_COLUMNS).order_by(Post.created_at.desc(), Post.id.desc()).limit(limit)
+    ).all()
+
+
+def as_dict(row):
+    return {
+        "id": row.id,
+        "title": row.title,
+        "platforms": row.platforms,
+        "status": row.status,
+        "scheduled_for": row.scheduled_for.isoformat() if row.scheduled_for else None,
+        "created_at": row.created_at.isoformat() if row.created_at else None,
+    }
@@ -0,0 +1,88 @@
+# poster/captions.py
+"""Caption engine over data/templates.csv.
+
+Templates are read once (again only when the file changes), compiled from their
+`[Product]` / `[Link]` placeholders into format strings and indexed by product_type.
+caption_offers() fills a whole batch in one pass: offers are grouped by product_type and
+each group walks its templates round-robin, continuing where the previous batch stopped,
+so the same template is never used twice in a row for a type that has more than one.
+Rendered captions are memoised in an LRU cache keyed by (template, product, link).
+"""
+import csv
+import os
+import re
+import threading
+from functools import lru_cache
+
+TEMPLATES_FILE = os.getenv("TEMPLATES_FILE", "data/templates.csv")
+CACHE_SIZE = int(os.getenv("CAPTION_CACHE_SIZE", 4096))
+FALLBACK_TEMPLATE = "Check this out! [Link] #ad"  # offers with no product name
+PLACEHOLDER = re.compile(r"\[(Product|Link)\]")
+
+
+def compile_template(text: str) -> str:
+    """'Try [Product]! [Link]' -> 'Try {product}! {link}' (literal braces escaped)."""
+    escaped = text.replace("{", "{{").replace("}", "}}")
+    return PLACEHOLDER.sub(lambda m: "{" + m.group(1).lower() + "}", escaped)
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def render(template: str, product: str, link: str) -> str:
+    return template.format(product=product, link=link)
+
+
+class CaptionEngine:
+    def __init__(self, path: str):
+        self.path = path
+        self.lock = threading.Lock()
+        self.signature = None
+        self.by_type = {}
+        self.all = []
+        self.fallback = compile_template(FALLBACK_TEMPLATE)
+        self.next_index = {}  # product_type -> rotation position
+
+    def load(self):
+        """(Re)compile templates if the file changed since the last load."""
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return
+        signature = (st.st_mtime_ns, st.st_size)
+        if signature == self.signature:
+            return
+        by_type = {}
+        with open(self.path, newline="", encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                text = (row.get("template") or "").strip()
+                if not text:
+                    continue
+                product_type = (row.get("product_type") or "").strip().lower()
+                by_type.setdefault(product_type, []).append(compile_template(text))
+        self.by_type = by_type
+        self.all = [t for templates in by_type.values() for t in templates]
+        self.signature = signature
+
+    def _templates_for(self, product_type: str):
+        return self.by_type.get(product_type) or self.all
+
+    def caption_offers(self, offers):
+        """Return a caption per offer ({"link", "product", "product_type"/"category"}), in order."""
+        with self.lock:
+            self.load()
+            captions = []
+            for offer in offers:
+                link = str(offer.get("link") or "")
+                product = str(offer.get("product") or "").strip()
+                product_type = str(offer.get("product_type") or offer.get("category") or "").strip().lower()
+                templates = self._templates_for(product_type) if product else []
+                if not templates:
+                    captions.append(render(self.fallback, product, link))
+                    continue
+                key = product_type if product_type in self.by_type else ""
+                i = self.next_index.get(key, 0)
+                self.next_index[key] = i + 1
+                captions.append(render(templates[i % len(templates)], product, link))
+            return captions
+
+
+engine = CaptionEngine(TEMPLATES_FILE)
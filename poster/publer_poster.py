@@ -1,27 +1,28 @@
 # poster/publer_poster.py
 import os
-import requests
-import pandas as pd
 from datetime import datetime
-import random
+
+import http_client
+from poster import captions
+from poster.store import OfferStore, append_csv
+from ratelimit import limiter
 
 PUBLER_API_KEY = os.getenv("PUBLER_API_KEY")
 PUBLER_ID = os.getenv("PUBLER_ID")  # your Publer account id env name
+PUBLER_API_URL = os.getenv("PUBLER_API_URL", "https://api.publer.io/v1")
 POSTS_FILE = os.getenv("POSTS_FILE", "data/posts.csv")
 POSTED_LOG = os.getenv("POSTED_LOG", "data/posted_log.csv")
+POSTER_DB = os.getenv("POSTER_DB", "data/poster.db")  # SQLite index over POSTS_FILE / POSTED_LOG
+
+store = OfferStore(POSTER_DB, POSTS_FILE, POSTED_LOG)
 
 def ensure_posted_log():
     if not os.path.exists(POSTED_LOG):
-        pd.DataFrame(columns=["link", "posted_at"]).to_csv(POSTED_LOG, index=False)
+        append_csv(POSTED_LOG, ["link", "posted_at"], [])
 
 def load_pending_posts():
-    if not os.path.exists(POSTS_FILE):
-        return []
-    df = pd.read_csv(POSTS_FILE)
-    ensure_posted_log()
-    posted = pd.read_csv(POSTED_LOG)["link"].astype(str).tolist() if os.path.exists(POSTED_LOG) else []
-    pending = df[~df["link"].astype(str).isin(posted)] if "link" in df.columns else df
-    return pending.to_dict(orient="records")
+    store.sync_catalogue()
+    return store.pending()
 
 def post_to_publer(post):
     """Let Publer generate captions/media (Business plan feature)"""
@@ -44,8 +45,11 @@ def post_to_publer(post):
         "Content-Type": "application/json"
     }
     try:
-        r = requests.post("https://api.publer.io/v1/posts", json=payload, headers=headers, timeout=20)
+        r = http_client.post(f"{PUBLER_API_URL}/posts", json=payload, headers=headers, timeout=20)
         print(f"[Publer] status {r.status_code}: {r.text}")
+        backoff = limiter.observe("publer", r)
+        if backoff:
+            print(f"[Publer] rate limited, backing off {int(backoff)}s")
         if r.status_code in (200, 201):
             return True, r.json() if r.text else {}
         return False, r.text
@@ -54,17 +58,22 @@ def post_to_publer(post):
         return False, None
 
 def mark_posted(link):
-    ensure_posted_log()
-    df = pd.read_csv(POSTED_LOG) if os.path.exists(POSTED_LOG) else pd.DataFrame(columns=["link","posted_at"])
-    df = pd.concat([df, pd.DataFrame([{"link": str(link), "posted_at": datetime.utcnow().isoformat() + "Z"}])], ignore_index=True)
-    df.to_csv(POSTED_LOG, index=False)
+    store.mark_posted(link)
+
+def posted_today_count():
+    return store.posted_since(datetime.utcnow().strftime("%Y-%m-%d"))
 
 def post_next():
-    pending = load_pending_posts()
-    if len(pending) == 0:
+    limiter.sync_daily({"publer": posted_today_count()})
+    ok, retry_at = limiter.acquire(["publer"])
+    if not ok:
+        print(f"[Poster] Rate limited, next slot at {retry_at.isoformat()}Z")
+        return False
+    store.sync_catalogue()
+    post = store.pick_pending()
+    if post is None:
         print("[Poster] No pending posts")
         return False
-    post = random.choice(pending)
     ok, resp = post_to_publer(post)
     if ok:
         mark_posted(post["link"])
@@ -76,29 +85,22 @@ def post_next():
 def append_new_posts_if_any(new_posts):
     """
     Append new posts to POSTS_FILE avoiding duplicates.
-    Accepts a list of dicts with keys: post_text, link, image_url, category (optional)
+    Accepts a list of dicts with keys: link, post_text (optional), image_url,
+    product / product_type / category (used to caption posts without post_text).
     Returns number of items appended.
     """
     if not new_posts:
         return 0
-    os.makedirs(os.path.dirname(POSTS_FILE) or ".", exist_ok=True)
-    df = pd.read_csv(POSTS_FILE) if os.path.exists(POSTS_FILE) else pd.DataFrame(columns=["post_text","platform","link","image_url"])
-    existing = set(df["link"].astype(str).tolist()) if "link" in df.columns else set()
-    added = 0
+    new_posts = [dict(p, link=p.get("link") or p.get("url")) for p in new_posts if p.get("link") or p.get("url")]
+    uncaptioned = [p for p in new_posts if not p.get("post_text")]
+    for p, caption in zip(uncaptioned, captions.engine.caption_offers(uncaptioned)):
+        p["post_text"] = caption
     rows = []
     for p in new_posts:
-        link = p.get("link") or p.get("url")
-        if not link or str(link) in existing:
-            continue
         rows.append({
-            "post_text": p.get("post_text", "Check this out! [Link]"),
+            "post_text": p["post_text"],
             "platform": "instagram,facebook,twitter,tiktok",
-            "link": link,
+            "link": str(p["link"]),
             "image_url": p.get("image_url", "")
         })
-        existing.add(str(link))
-        added += 1
-    if rows:
-        df = pd.concat([df, pd.DataFrame(rows)], ignore_index=True)
-        df.to_csv(POSTS_FILE, index=False)
-    return added
+    return len(store.add_offers(rows))
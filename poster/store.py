@@ -0,0 +1,211 @@
+# poster/store.py
+"""SQLite-backed offer store for the Publer poster.
+
+posts.csv stays the editable catalogue and posted_log.csv stays an append-only audit
+log, but lookups go through an indexed SQLite table instead of re-reading both CSVs:
+marking a link posted is a single upsert, picking a pending link is an index seek.
+posts.csv is only re-imported when its size/mtime changes. New offers are matched on
+link_key, the link normalized by dedup.normalize_link, so the same offer behind another
+tracking parameter or www./https variant is not queued twice.
+"""
+import csv
+import os
+import random
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+
+from dedup import normalize_link
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS offers (
+    id INTEGER PRIMARY KEY,
+    link TEXT NOT NULL UNIQUE,
+    post_text TEXT,
+    platform TEXT,
+    image_url TEXT,
+    posted_at TEXT
+);
+CREATE INDEX IF NOT EXISTS ix_offers_pending ON offers(id) WHERE posted_at IS NULL;
+CREATE INDEX IF NOT EXISTS ix_offers_posted_at ON offers(posted_at);
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+"""
+
+CSV_COLUMNS = ["post_text", "platform", "link", "image_url"]
+OFFER_COLUMNS = "id, link, post_text, platform, image_url"
+
+
+def append_csv(path, columns, rows):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    new_file = not os.path.exists(path) or os.path.getsize(path) == 0
+    missing_newline = False
+    if not new_file:
+        with open(path, "rb") as f:
+            f.seek(-1, os.SEEK_END)
+            missing_newline = f.read(1) not in (b"\n", b"\r")
+    with open(path, "a", newline="", encoding="utf-8") as f:
+        if missing_newline:
+            f.write("\n")
+        writer = csv.DictWriter(f, fieldnames=columns, extrasaction="ignore")
+        if new_file:
+            writer.writeheader()
+        writer.writerows(rows)
+
+
+class OfferStore:
+    def __init__(self, db_path: str, posts_file: str, posted_log: str):
+        self.db_path = db_path
+        self.posts_file = posts_file
+        self.posted_log = posted_log
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    # ---------- connection / schema ----------
+    def conn(self):
+        c = getattr(self._local, "conn", None)
+        if c is None:
+            os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+            c = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            c.row_factory = sqlite3.Row
+            c.execute("PRAGMA journal_mode=WAL")
+            c.executescript(SCHEMA)
+            self._ensure_link_key(c)
+            self._local.conn = c
+            self._import_posted_log_once(c)
+        return c
+
+    @contextmanager
+    def _write(self, c):
+        """BEGIN IMMEDIATE ... COMMIT, rolled back if the block raises so the write lock is never left held."""
+        c.execute("BEGIN IMMEDIATE")
+        try:
+            yield
+        except BaseException:
+            c.execute("ROLLBACK")
+            raise
+        c.execute("COMMIT")
+
+    def _meta(self, c, key):
+        row = c.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_meta(self, c, key, value):
+        c.execute("INSERT INTO meta(key, value) VALUES(?, ?) ON CONFLICT(key) DO UPDATE SET value = excluded.value", (key, value))
+
+    def _ensure_link_key(self, c):
+        """Add and backfill offers.link_key on stores created before it existed."""
+        if "link_key" not in {row[1] for row in c.execute("PRAGMA table_info(offers)")}:
+            with self._lock:
+                with self._write(c):
+                    c.execute("ALTER TABLE offers ADD COLUMN link_key TEXT")
+                    rows = c.execute("SELECT id, link FROM offers").fetchall()
+                    c.executemany("UPDATE offers SET link_key = ? WHERE id = ?", [(normalize_link(r[1]), r[0]) for r in rows])
+        c.execute("CREATE INDEX IF NOT EXISTS ix_offers_link_key ON offers(link_key)")
+
+    def _import_posted_log_once(self, c):
+        """Seed posted links from an existing posted_log.csv the first time the store is created."""
+        if self._meta(c, "posted_log_imported") or not os.path.exists(self.posted_log):
+            return
+        with open(self.posted_log, newline="", encoding="utf-8") as f:
+            rows = [(r["link"], normalize_link(r["link"]), r.get("posted_at") or "") for r in csv.DictReader(f) if r.get("link")]
+        with self._write(c):
+            c.executemany(
+                "INSERT INTO offers(link, link_key, posted_at) VALUES(?, ?, ?) "
+                "ON CONFLICT(link) DO UPDATE SET posted_at = COALESCE(offers.posted_at, excluded.posted_at)",
+                rows,
+            )
+            self._set_meta(c, "posted_log_imported", "1")
+
+    # ---------- catalogue ----------
+    def _csv_signature(self):
+        st = os.stat(self.posts_file)
+        return f"{st.st_mtime_ns}:{st.st_size}"
+
+    def sync_catalogue(self):
+        """Upsert posts.csv into the store if the file changed since the last import."""
+        if not os.path.exists(self.posts_file):
+            return
+        c = self.conn()
+        sig = self._csv_signature()
+        if self._meta(c, "posts_csv_signature") == sig:
+            return
+        with self._lock:
+            with open(self.posts_file, newline="", encoding="utf-8") as f:
+                rows = [
+                    (str(r["link"]), normalize_link(str(r["link"])), r.get("post_text") or "", r.get("platform") or "", r.get("image_url") or "")
+                    for r in csv.DictReader(f)
+                    if r.get("link")
+                ]
+            with self._write(c):
+                c.executemany(
+                    "INSERT INTO offers(link, link_key, post_text, platform, image_url) VALUES(?, ?, ?, ?, ?) "
+                    "ON CONFLICT(link) DO UPDATE SET post_text = excluded.post_text, "
+                    "platform = excluded.platform, image_url = excluded.image_url",
+                    rows,
+                )
+                self._set_meta(c, "posts_csv_signature", sig)
+
+    def add_offers(self, offers):
+        """Insert offers whose (normalized) link is new, append them to posts.csv, and return the ones added."""
+        self.sync_catalogue()
+        c = self.conn()
+        added = []
+        with self._lock:
+            with self._write(c):
+                for o in offers:
+                    link_key = normalize_link(o["link"])
+                    if c.execute("SELECT 1 FROM offers WHERE link_key = ? LIMIT 1", (link_key,)).fetchone():
+                        continue
+                    cur = c.execute(
+                        "INSERT OR IGNORE INTO offers(link, link_key, post_text, platform, image_url) VALUES(?, ?, ?, ?, ?)",
+                        (o["link"], link_key, o["post_text"], o["platform"], o["image_url"]),
+                    )
+                    if cur.rowcount == 1:
+                        added.append(o)
+                if added:
+                    append_csv(self.posts_file, CSV_COLUMNS, added)
+                    self._set_meta(c, "posts_csv_signature", self._csv_signature())
+        return added
+
+    # ---------- posting ----------
+    def pending(self):
+        c = self.conn()
+        rows = c.execute(f"SELECT {OFFER_COLUMNS} FROM offers WHERE posted_at IS NULL ORDER BY id").fetchall()
+        return [self._record(r) for r in rows]
+
+    def pick_pending(self):
+        """Return a random-ish pending offer via the partial index (no full scan), or None."""
+        c = self.conn()
+        max_id = c.execute("SELECT MAX(id) FROM offers").fetchone()[0]
+        if not max_id:
+            return None
+        start = random.randint(1, max_id)
+        row = c.execute(
+            f"SELECT {OFFER_COLUMNS} FROM offers WHERE posted_at IS NULL AND id >= ? ORDER BY id LIMIT 1", (start,)
+        ).fetchone() or c.execute(
+            f"SELECT {OFFER_COLUMNS} FROM offers WHERE posted_at IS NULL AND id < ? ORDER BY id DESC LIMIT 1", (start,)
+        ).fetchone()
+        return self._record(row) if row else None
+
+    def mark_posted(self, link):
+        posted_at = datetime.utcnow().isoformat() + "Z"
+        c = self.conn()
+        c.execute(
+            "INSERT INTO offers(link, link_key, posted_at) VALUES(?, ?, ?) ON CONFLICT(link) DO UPDATE SET posted_at = excluded.posted_at",
+            (str(link), normalize_link(str(link)), posted_at),
+        )
+        with self._lock:
+            append_csv(self.posted_log, ["link", "posted_at"], [{"link": str(link), "posted_at": posted_at}])
+
+    def is_posted(self, link):
+        row = self.conn().execute("SELECT posted_at FROM offers WHERE link = ?", (str(link),)).fetchone()
+        return bool(row and row[0])
+
+    def posted_since(self, since_iso: str):
+        return self.conn().execute("SELECT COUNT(*) FROM offers WHERE posted_at >= ?", (since_iso,)).fetchone()[0]
+
+    # ---------- helpers ----------
+    @staticmethod
+    def _record(row):
+        return {"post_text": row["post_text"] or "", "platform": row["platform"] or "", "link": row["link"], "image_url": row["image_url"] or ""}
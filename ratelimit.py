@@ -0,0 +1,203 @@
+# ratelimit.py
+"""Per-platform rate limiting driven by config.yaml.
+
+Each platform gets a token bucket (sustained per_minute rate + burst) and a daily
+quota. Responses are fed back through observe() so Retry-After / rate-limit headers
+pause a platform until the upstream says it is safe again. Callers that cannot send
+yet get a retry time back and are expected to re-schedule, not fail.
+"""
+import json
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from email.utils import parsedate_to_datetime
+
+import config
+
+DEFAULT_BACKOFF_SECONDS = 60  # 429 without any usable header
+FB_USAGE_THRESHOLD = 95  # percent of X-App-Usage at which we stop calling Graph API
+
+
+class TokenBucket:
+    def __init__(self, per_minute: float, burst: int):
+        self.rate = per_minute / 60.0
+        self.capacity = max(1, burst)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self):
+        """Seconds until one token is available (0 if one is available now)."""
+        self._refill()
+        if self.tokens >= 1:
+            return 0.0
+        if self.rate <= 0:
+            return float("inf")
+        return (1 - self.tokens) / self.rate
+
+    def take(self):
+        self._refill()
+        self.tokens -= 1
+
+
+class RateLimiter:
+    def __init__(self, limits: dict, default_per_day: int | None = None):
+        self.buckets = {}
+        self.per_day = {}
+        for platform, spec in (limits or {}).items():
+            spec = spec or {}
+            if spec.get("per_minute"):
+                self.buckets[platform] = TokenBucket(float(spec["per_minute"]), int(spec.get("burst", 1)))
+            per_day = spec.get("per_day", default_per_day)
+            if per_day:
+                self.per_day[platform] = int(per_day)
+        self.default_per_day = default_per_day
+        self.used_today = {}
+        self.day = self._today()
+        self.blocked_until = {}  # platform -> monotonic time
+        self.lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls):
+        publer = config.section("publer")
+        return cls(config.section("rate_limits"), default_per_day=publer.get("max_posts_per_day"))
+
+    @staticmethod
+    def _today():
+        return datetime.now(timezone.utc).date()
+
+    def _roll_day(self):
+        today = self._today()
+        if today != self.day:
+            self.day = today
+            self.used_today = {}
+
+    def _daily_limit(self, platform):
+        return self.per_day.get(platform, self.default_per_day)
+
+    def _seconds_until_midnight(self):
+        now = datetime.now(timezone.utc)
+        tomorrow = datetime.combine(now.date() + timedelta(days=1), datetime.min.time(), tzinfo=timezone.utc)
+        return (tomorrow - now).total_seconds()
+
+    def acquire(self, platforms):
+        """Take one send slot on every platform, or none at all.
+
+        Returns (True, None) when the caller may send, otherwise (False, retry_at) with
+        retry_at a naive UTC datetime at which trying again makes sense.
+        """
+        platforms = list(dict.fromkeys(platforms))
+        with self.lock:
+            self._roll_day()
+            wait = 0.0
+            for platform in platforms:
+                blocked = self.blocked_until.get(platform, 0) - time.monotonic()
+                if blocked > 0:
+                    wait = max(wait, blocked)
+                limit = self._daily_limit(platform)
+                if limit and self.used_today.get(platform, 0) >= limit:
+                    wait = max(wait, self._seconds_until_midnight())
+                bucket = self.buckets.get(platform)
+                if bucket:
+                    wait = max(wait, bucket.wait_time())
+            if wait > 0:
+                return False, datetime.utcnow() + timedelta(seconds=min(wait, 86400))
+            for platform in platforms:
+                bucket = self.buckets.get(platform)
+                if bucket:
+                    bucket.take()
+                self.used_today[platform] = self.used_today.get(platform, 0) + 1
+            return True, None
+
+    def sync_daily(self, counts: dict):
+        """Merge today's send counts recorded elsewhere (e.g. the DB, shared by all workers)."""
+        with self.lock:
+            self._roll_day()
+            for platform, used in counts.items():
+                self.used_today[platform] = max(self.used_today.get(platform, 0), int(used))
+
+    def block(self, platform: str, seconds: float):
+        with self.lock:
+            until = time.monotonic() + seconds
+            self.blocked_until[platform] = max(self.blocked_until.get(platform, 0), until)
+
+    def observe(self, platform: str, response):
+        """Read rate-limit headers from an HTTP response; returns the back-off applied in seconds, if any."""
+        backoff = retry_after_seconds(response)
+        if backoff:
+            self.block(platform, backoff)
+        return backoff
+
+    def snapshot(self):
+        with self.lock:
+            self._roll_day()
+            now = time.monotonic()
+            return {
+                platform: {
+                    "used_today": self.used_today.get(platform, 0),
+                    "per_day": self._daily_limit(platform),
+                    "tokens": round(self.buckets[platform].tokens, 2) if platform in self.buckets else None,
+                    "blocked_for": max(0, round(self.blocked_until.get(platform, 0) - now, 1)),
+                }
+                for platform in sorted(set(self.buckets) | set(self.per_day) | set(self.used_today))
+            }
+
+
+def _header_float(headers, name):
+    try:
+        return float(headers.get(name))
+    except (TypeError, ValueError):
+        return None
+
+
+def retry_after_seconds(response):
+    """Work out how long to back off from a response's status and rate-limit headers."""
+    headers = getattr(response, "headers", None) or {}
+    status = getattr(response, "status_code", None)
+
+    retry_after = headers.get("Retry-After")
+    if retry_after:
+        try:
+            return max(0.0, float(retry_after))
+        except ValueError:
+            try:
+                when = parsedate_to_datetime(retry_after)
+                return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+            except (TypeError, ValueError):
+                pass
+
+    # X / Twitter and most REST APIs: remaining + reset (epoch seconds or delta)
+    for prefix in ("x-rate-limit", "x-ratelimit", "ratelimit"):
+        remaining = _header_float(headers, f"{prefix}-remaining")
+        reset = _header_float(headers, f"{prefix}-reset")
+        if remaining is not None and remaining <= 0 and reset is not None:
+            delta = reset - time.time() if reset > 1_000_000_000 else reset
+            return max(1.0, delta)
+
+    # Facebook / Instagram Graph API usage headers (percentages, minutes to regain access)
+    for name in ("X-Business-Use-Case-Usage", "X-App-Usage", "X-Ad-Account-Usage"):
+        raw = headers.get(name)
+        if not raw:
+            continue
+        try:
+            usage = json.loads(raw)
+        except ValueError:
+            continue
+        entries = [e for v in usage.values() for e in v] if name == "X-Business-Use-Case-Usage" else [usage]
+        for entry in entries:
+            minutes = entry.get("estimated_time_to_regain_access") or 0
+            if minutes:
+                return minutes * 60.0
+            if any((entry.get(k) or 0) >= FB_USAGE_THRESHOLD for k in ("call_count", "total_time", "total_cputime")):
+                return float(DEFAULT_BACKOFF_SECONDS)
+
+    if status == 429:
+        return float(DEFAULT_BACKOFF_SECONDS)
+    return None
+
+
+limiter = RateLimiter.from_config()
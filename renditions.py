@@ -0,0 +1,286 @@
+# renditions.py
+"""Per-platform media renditions and thumbnails, built off the request/scheduler threads.
+
+create_post calls submit() once the upload is stored; a small process pool then resizes
+images with Pillow (no ffmpeg needed) and runs videos through the configured encoder,
+writing `<stem>.<platform>.<tag>.<ext>` files and a `<stem>.renditions.json` manifest
+next to the original. The publishing tick only looks at the manifest: posts whose media
+is not ready yet are re-scheduled instead of being processed inline. Every file is written
+under a unique temporary name and moved into place, so two processes preparing the same
+upload (web and worker on shared storage) can't clobber each other; an I/O error leaves
+no manifest behind, so the upload is prepared again on the next submit().
+
+Video encoders are pluggable (VIDEO_ENCODERS, `media.video_encoder` in config.yaml):
+"copy" sends the original and only checks the platform's size limit, "ffmpeg" transcodes
+to H.264/AAC mp4 and grabs a thumbnail frame.
+"""
+import hashlib
+import json
+import multiprocessing
+import os
+import shutil
+import subprocess
+import threading
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+
+import config
+
+MEDIA_WORKERS = int(os.getenv("MEDIA_WORKERS", 2))
+IMAGE_EXTENSIONS = {"png", "jpg", "jpeg"}
+VIDEO_EXTENSIONS = {"mp4", "mov"}
+MB = 1024 * 1024
+
+DEFAULT_PLATFORMS = {
+    "facebook": {"max_px": 2048, "max_image_mb": 4, "max_video_mb": 1024},
+    "instagram": {"max_px": 1080, "min_aspect": 0.8, "max_aspect": 1.91, "max_image_mb": 8, "max_video_mb": 100},
+    "x": {"max_px": 2048, "max_image_mb": 5, "max_video_mb": 512},
+    "tiktok": {"max_px": 1080, "max_image_mb": 20, "max_video_mb": 287},
+}
+
+_pool = None
+_in_flight = {}
+_lock = threading.Lock()
+
+
+def settings():
+    cfg = config.section("media")
+    platforms = {**DEFAULT_PLATFORMS, **(cfg.get("platforms") or {})}
+    return {
+        "platforms": platforms,
+        "thumbnail_px": int(cfg.get("thumbnail_px", 320)),
+        "video_encoder": cfg.get("video_encoder", "copy"),
+    }
+
+
+def settings_tag(opts: dict) -> str:
+    """Short hash of the rendition settings; changing them invalidates existing renditions."""
+    return hashlib.sha1(json.dumps(opts, sort_keys=True).encode()).hexdigest()[:8]
+
+
+def split_name(filename: str):
+    stem, _, ext = filename.rpartition(".")
+    return (stem, ext.lower()) if stem else (filename, "")
+
+
+def manifest_path(folder: str, filename: str) -> str:
+    return os.path.join(folder, f"{split_name(filename)[0]}.renditions.json")
+
+
+def load_manifest(folder: str, filename: str):
+    try:
+        with open(manifest_path(folder, filename), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def is_ready(folder: str, filename: str) -> bool:
+    """True once renditions for the current settings exist (or the source is gone, so there is nothing to wait for)."""
+    if not os.path.exists(os.path.join(folder, filename)):
+        return True
+    manifest = load_manifest(folder, filename)
+    return bool(manifest) and manifest.get("tag") == settings_tag(settings())
+
+
+def rendition_for(folder: str, filename: str, platform: str):
+    """(filename to send, error) for `platform`; falls back to the original when there is no manifest entry."""
+    manifest = load_manifest(folder, filename) or {}
+    error = (manifest.get("errors") or {}).get(platform)
+    if error:
+        return None, error
+    return (manifest.get("renditions") or {}).get(platform, filename), None
+
+
+def thumbnail_for(folder: str, filename: str):
+    return (load_manifest(folder, filename) or {}).get("thumbnail")
+
+
+# ---------- pool ----------
+def submit(folder: str, filename: str):
+    """Queue rendition work for an upload unless it is ready or already queued in this process."""
+    global _pool
+    if is_ready(folder, filename):
+        return None
+    with _lock:
+        fut = _in_flight.get(filename)
+        if fut is not None and not fut.done():
+            return fut
+        try:
+            if _pool is None:
+                # spawn: workers import only this module, not the app (and not its threads)
+                _pool = ProcessPoolExecutor(max_workers=MEDIA_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+            fut = _pool.submit(prepare, folder, filename, settings())
+        except Exception as e:
+            # e.g. BrokenProcessPool after a worker died; the next tick retries with a fresh pool
+            print(f"[Media] could not queue renditions for {filename}: {e}")
+            _pool = None
+            return None
+        _in_flight[filename] = fut
+        fut.add_done_callback(_done)
+        return fut
+
+
+def _done(fut):
+    with _lock:
+        for name, f in list(_in_flight.items()):
+            if f is fut:
+                del _in_flight[name]
+    if fut.exception() is not None:
+        print(f"[Media] rendition job failed: {fut.exception()}")
+
+
+# ---------- worker side ----------
+def prepare(folder: str, filename: str, opts: dict):
+    """Build every platform rendition plus a thumbnail and write the manifest last."""
+    src = os.path.join(folder, filename)
+    stem, ext = split_name(filename)
+    tag = settings_tag(opts)
+    manifest = {"source": filename, "tag": tag, "renditions": {}, "errors": {}, "thumbnail": None}
+    io_errors = []
+    for platform, spec in opts["platforms"].items():
+        dest_base = os.path.join(folder, f"{stem}.{platform}.{tag}")
+        try:
+            if ext in VIDEO_EXTENSIONS:
+                out = VIDEO_ENCODERS[opts["video_encoder"]](src, dest_base, spec)
+            elif ext in IMAGE_EXTENSIONS:
+                out = render_image(src, dest_base, spec)
+            else:
+                out = check_size(src, spec.get("max_image_mb"))  # gif: keep the animation, only size-check
+            manifest["renditions"][platform] = os.path.basename(out)
+        except Exception as e:
+            if is_io_error(e):
+                io_errors.append(f"{platform}: {e}")
+            else:
+                manifest["errors"][platform] = f"Media not usable on {platform}: {e}"
+    try:
+        thumb_base = os.path.join(folder, f"{stem}.thumb.{tag}")
+        if ext in VIDEO_EXTENSIONS:
+            thumb = VIDEO_THUMBNAILERS[opts["video_encoder"]](src, thumb_base, opts["thumbnail_px"])
+        else:
+            thumb = render_image(src, thumb_base, {"max_px": opts["thumbnail_px"]})
+        manifest["thumbnail"] = os.path.basename(thumb) if thumb else None
+    except Exception as e:
+        print(f"[Media] thumbnail failed for {filename}: {e}")
+    if io_errors:
+        # not the media's fault: no manifest, so the next submit() builds it again
+        raise OSError(f"{filename}: " + "; ".join(io_errors))
+    write_atomic(manifest_path(folder, filename), json.dumps(manifest).encode())
+    return manifest
+
+
+def is_io_error(exc: Exception) -> bool:
+    """File system trouble (missing file, lost race, full disk) rather than unusable media.
+
+    Decoder errors such as PIL's UnidentifiedImageError are OSErrors too, but carry no errno.
+    """
+    return isinstance(exc, OSError) and exc.errno is not None
+
+
+def temp_path(dest: str, ext: str = "") -> str:
+    """Unique sibling of `dest` to write to before os.replace()."""
+    return f"{dest}.{os.getpid()}.{uuid.uuid4().hex[:8]}.tmp{ext}"
+
+
+def discard(tmp: str):
+    """Remove a temp file left behind by a failed write (no-op once it has been moved into place)."""
+    try:
+        os.remove(tmp)
+    except FileNotFoundError:
+        pass
+
+
+def write_atomic(path: str, data: bytes):
+    tmp = temp_path(path)
+    try:
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+    finally:
+        discard(tmp)
+
+
+def check_size(src: str, max_mb):
+    if max_mb and os.path.getsize(src) > float(max_mb) * MB:
+        raise ValueError(f"{os.path.getsize(src) / MB:.1f} MB exceeds the {max_mb} MB limit")
+    return src
+
+
+def render_image(src: str, dest_base: str, spec: dict) -> str:
+    """Orientation-fixed RGB JPEG, cropped to the allowed aspect range and scaled to max_px."""
+    from PIL import Image, ImageOps
+
+    dest = f"{dest_base}.jpg"
+    with Image.open(src) as im:
+        im = ImageOps.exif_transpose(im)
+        if im.mode != "RGB":
+            im = im.convert("RGB")
+        w, h = im.size
+        lo, hi = spec.get("min_aspect"), spec.get("max_aspect")
+        if lo and w / h < lo:
+            new_h = int(w / lo)
+            top = (h - new_h) // 2
+            im = im.crop((0, top, w, top + new_h))
+        elif hi and w / h > hi:
+            new_w = int(h * hi)
+            left = (w - new_w) // 2
+            im = im.crop((left, 0, left + new_w, h))
+        max_px = int(spec.get("max_px", 2048))
+        im.thumbnail((max_px, max_px), Image.LANCZOS)
+        max_bytes = float(spec.get("max_image_mb") or 0) * MB
+        tmp = temp_path(dest)
+        try:
+            for quality in (88, 80, 70, 60):
+                im.save(tmp, "JPEG", quality=quality, optimize=True, progressive=True)
+                if not max_bytes or os.path.getsize(tmp) <= max_bytes:
+                    break
+            os.replace(tmp, dest)
+        finally:
+            discard(tmp)
+    return check_size(dest, spec.get("max_image_mb"))
+
+
+def copy_video(src: str, dest_base: str, spec: dict) -> str:
+    return check_size(src, spec.get("max_video_mb"))
+
+
+def ffmpeg_video(src: str, dest_base: str, spec: dict) -> str:
+    dest = f"{dest_base}.mp4"
+    max_px = int(spec.get("max_px", 1080))
+    tmp = temp_path(dest, ".mp4")
+    try:
+        subprocess.run(
+            [
+                shutil.which("ffmpeg") or "ffmpeg", "-y", "-loglevel", "error", "-i", src,
+                "-vf", f"scale='min({max_px},iw)':-2", "-c:v", "libx264", "-preset", "veryfast", "-crf", "23",
+                "-c:a", "aac", "-movflags", "+faststart", tmp,
+            ],
+            check=True,
+            capture_output=True,
+        )
+        os.replace(tmp, dest)
+    finally:
+        discard(tmp)
+    return check_size(dest, spec.get("max_video_mb"))
+
+
+def ffmpeg_thumbnail(src: str, dest_base: str, px: int) -> str:
+    dest = f"{dest_base}.jpg"
+    tmp = temp_path(dest, ".jpg")
+    try:
+        subprocess.run(
+            [
+                shutil.which("ffmpeg") or "ffmpeg", "-y", "-loglevel", "error", "-ss", "1", "-i", src,
+                "-frames:v", "1", "-vf", f"scale={px}:-2", tmp,
+            ],
+            check=True,
+            capture_output=True,
+        )
+        os.replace(tmp, dest)
+    finally:
+        discard(tmp)
+    return dest
+
+
+VIDEO_ENCODERS = {"copy": copy_video, "ffmpeg": ffmpeg_video}
+VIDEO_THUMBNAILERS = {"copy": lambda src, dest_base, px: None, "ffmpeg": ffmpeg_thumbnail}
@@ -0,0 +1,40 @@
+# retry.py
+"""Retry policy for per-platform deliveries.
+
+Transient failures (timeouts, connection errors, 408/425/429/5xx) are retried with
+exponential backoff and jitter up to MAX_ATTEMPTS; anything else (bad credentials,
+4xx validation errors, unknown platform) fails permanently on the first try.
+"""
+import os
+import random
+
+MAX_ATTEMPTS = int(os.getenv("DELIVERY_MAX_ATTEMPTS", 6))
+BASE_DELAY_SECONDS = float(os.getenv("RETRY_BASE_SECONDS", 30))
+MAX_DELAY_SECONDS = float(os.getenv("RETRY_MAX_SECONDS", 3600))
+
+TRANSIENT_STATUS = {408, 425, 429, 500, 502, 503, 504}
+
+
+def is_transient_exception(exc: Exception) -> bool:
+    import requests
+
+    return isinstance(exc, (requests.Timeout, requests.ConnectionError))
+
+
+def exception_result(exc: Exception, prefix: str = "Exception: "):
+    """Poster result for an exception, tagged transient when retrying could help."""
+    return {"ok": False, "msg": f"{prefix}{exc}", "transient": is_transient_exception(exc)}
+
+
+def is_transient(res: dict) -> bool:
+    if res.get("deferred"):
+        return True
+    if "transient" in res:
+        return bool(res["transient"])
+    return res.get("status") in TRANSIENT_STATUS
+
+
+def backoff_seconds(attempt: int) -> float:
+    """Delay before retry number `attempt` (1-based): exponential, capped, with equal jitter."""
+    delay = min(MAX_DELAY_SECONDS, BASE_DELAY_SECONDS * (2 ** max(attempt - 1, 0)))
+    return delay / 2 + random.uniform(0, delay / 2)
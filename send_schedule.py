@@ -0,0 +1,234 @@
+# send_schedule.py
+"""Send-time planning for the Post queue and an exact-wakeup dispatcher.
+
+plan() gives every pending post without a scheduled_for a slot. Each UTC day has
+max_posts_per_day slots laid out along the day's hourly weight profile (flat by default,
+or the summed per-platform peak hours from the send_schedule section of config.yaml);
+new posts take the next free slots. A platform with a per_day cap also gets its own grid
+of per_day slots over the same profile: a post for it waits for that platform's next free
+slot, and moves to the next day once they are used up. Output is therefore paced at the
+quota overall and at per_day for each capped platform, instead of bursting whenever a
+batch arrives.
+
+Dispatcher keeps the upcoming due times in a heap and sleeps until the earliest one,
+so the publisher runs when a post is due rather than on a fixed polling interval. The
+heap is refreshed after every run and at least every SCHEDULE_REFRESH_SECONDS to pick up
+posts created by other processes; wake() runs it early.
+"""
+import heapq
+from bisect import bisect_left
+import os
+import threading
+import time
+import traceback
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+import sqlalchemy as sa
+
+import config
+import instrumentation
+from models import Post, db
+
+REFRESH_SECONDS = float(os.getenv("SCHEDULE_REFRESH_SECONDS", 60))
+HEAP_SIZE = 500
+
+
+def hour_weights(platforms=()):
+    """24 relative weights for one day: sum of the platforms' peak-hour profiles, flat if none configured."""
+    cfg = config.section("send_schedule")
+    base = cfg.get("hour_weights")
+    per_platform = cfg.get("platform_hour_weights") or {}
+    profiles = [per_platform[p] for p in platforms if p in per_platform] or ([base] if base else [])
+    if not profiles:
+        return [1.0] * 24
+    weights = [0.0] * 24
+    for profile in profiles:
+        for hour, w in (profile.items() if isinstance(profile, dict) else enumerate(profile)):
+            weights[int(hour)] += float(w)
+    return weights if sum(weights) > 0 else [1.0] * 24
+
+
+class DayGrid:
+    """`quota` send slots for one UTC day, spaced so each hour gets slots in proportion to its weight."""
+
+    def __init__(self, day: datetime, quota: int, weights):
+        self.day = day
+        self.quota = quota
+        self.weights = weights
+        self.total = sum(weights)
+
+    def slot(self, k: int) -> datetime:
+        target = (k + 0.5) / self.quota * self.total
+        for hour, w in enumerate(self.weights):
+            if w > 0 and target <= w:
+                return self.day + timedelta(hours=hour + target / w)
+            target -= w
+        return self.day + timedelta(hours=24) - timedelta(seconds=1)
+
+    def taken(self, times) -> set:
+        """Slot indices occupied by already scheduled times; a manually chosen time takes the next slot."""
+        return {min(self.first_slot_after(t), self.quota - 1) for t in times}
+
+    def containing(self, t: datetime) -> int:
+        """Index of the last slot at or before `t` (0 before the first one)."""
+        return max(self.first_slot_after(t + timedelta(microseconds=1)) - 1, 0)
+
+    def first_slot_after(self, now: datetime) -> int:
+        lo, hi = 0, self.quota
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.slot(mid) < now:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+
+def day_usage(day: datetime, platform_key):
+    """(scheduled_for times, {platform: its scheduled_for times}) of the posts already scheduled for `day`."""
+    rows = db.session.execute(
+        sa.select(Post.scheduled_for, Post.platforms)
+        .where(Post.scheduled_for >= day, Post.scheduled_for < day + timedelta(days=1))
+    ).all()
+    per_platform = defaultdict(list)
+    for when, csv in rows:
+        for p in {platform_key(p) for p in (csv or "").split(",") if p.strip()}:
+            per_platform[p].append(when)
+    return [when for when, _ in rows], per_platform
+
+
+def plan(quota: int, per_day: dict, platform_key, now: datetime | None = None):
+    """Assign send slots to unscheduled pending posts; returns [(scheduled_for, post_id), ...].
+
+    `quota` caps posts per day, `per_day` caps posts per platform per day, and
+    `platform_key` maps a Post.platforms entry to its rate-limit key.
+    """
+    now = now or datetime.utcnow()
+    backlog = [
+        (post_id, sorted({platform_key(p) for p in (platforms or "").split(",") if p.strip()}))
+        for post_id, platforms in db.session.execute(
+            sa.select(Post.id, Post.platforms)
+            .where(Post.status == "pending", Post.scheduled_for.is_(None))
+            .order_by(Post.id)
+        ).all()
+    ]
+    if not backlog or quota <= 0:
+        return []
+    weights = hour_weights(sorted({p for _, platforms in backlog for p in platforms}))
+    assigned = []
+    day = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    while backlog:
+        grid = DayGrid(day, quota, weights)
+        times, times_by_platform = day_usage(day, platform_key)
+        used = len(times)
+        taken = grid.taken(times)
+        free = [k for k in range(grid.first_slot_after(now), quota) if k not in taken]
+        left = quota - used
+        paced = {}  # capped platform -> (its DayGrid, its free slot indices, at most its remaining room)
+        for p, cap in per_day.items():
+            if not cap:
+                continue
+            pgrid = DayGrid(day, cap, weights)
+            ptaken = {pgrid.containing(t) for t in times_by_platform[p]}
+            room = max(cap - len(times_by_platform[p]), 0)
+            paced[p] = (pgrid, [j for j in range(pgrid.first_slot_after(now), cap) if j not in ptaken][:room])
+        deferred = []
+        for post_id, platforms in backlog:
+            capped = [p for p in platforms if p in paced]
+            if left <= 0 or any(not paced[p][1] for p in capped):
+                deferred.append((post_id, platforms))
+                continue
+            earliest = max((paced[p][0].slot(paced[p][1][0]) for p in capped), default=None)
+            i = bisect_left(free, earliest, key=grid.slot) if earliest else 0
+            if i >= len(free):
+                deferred.append((post_id, platforms))
+                continue
+            assigned.append((grid.slot(free.pop(i)), post_id))
+            left -= 1
+            for p in capped:
+                paced[p][1].pop(0)
+        if len(deferred) == len(backlog) and used == 0 and day > now:
+            break  # nothing fits even on an empty day (a platform with per_day 0); leave those unplanned
+        backlog = deferred
+        day += timedelta(days=1)
+    if assigned:
+        db.session.execute(
+            sa.update(Post.__table__)
+            .where(
+                Post.__table__.c.id == sa.bindparam("b_id"),
+                Post.__table__.c.status == "pending",
+                Post.__table__.c.scheduled_for.is_(None),
+            )
+            .values(scheduled_for=sa.bindparam("b_when")),
+            [{"b_id": post_id, "b_when": when} for when, post_id in assigned],
+        )
+    db.session.commit()
+    return assigned
+
+
+def upcoming(limit: int = HEAP_SIZE):
+    """Next (due time, post_id) pairs: scheduled pending posts and leases that will expire."""
+    pending = db.session.execute(
+        sa.select(Post.scheduled_for, Post.id)
+        .where(Post.status == "pending", Post.scheduled_for.isnot(None))
+        .order_by(Post.scheduled_for)
+        .limit(limit)
+    ).all()
+    leases = db.session.execute(
+        sa.select(Post.lease_expires_at, Post.id)
+        .where(Post.status == "processing", Post.lease_expires_at.isnot(None))
+        .order_by(Post.lease_expires_at)
+        .limit(limit)
+    ).all()
+    return [tuple(r) for r in pending] + [tuple(r) for r in leases]
+
+
+class Dispatcher:
+    def __init__(self, flask_app, run):
+        """`run()` is called inside an app context; it publishes what is due and returns upcoming()."""
+        self.flask_app = flask_app
+        self.run = run
+        self.heap = []
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.stopped = False
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self._loop, name="send-dispatcher", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stopped = True
+        self.wakeup.set()
+
+    def wake(self):
+        self.wakeup.set()
+
+    def next_due(self):
+        with self.lock:
+            return self.heap[0][0] if self.heap else None
+
+    def _loop(self):
+        while not self.stopped:
+            try:
+                with self.flask_app.app_context():
+                    items = self.run()
+                with self.lock:
+                    self.heap = list(items)
+                    heapq.heapify(self.heap)
+            except Exception:
+                instrumentation.JOB_ERRORS.inc(job="dispatcher")
+                print("Error in send dispatcher:")
+                traceback.print_exc()
+            self.wakeup.clear()
+            due = self.next_due()
+            wait = REFRESH_SECONDS
+            if due is not None:
+                wait = min(wait, max((due - datetime.utcnow()).total_seconds(), 0.0))
+            if wait > 0:
+                self.wakeup.wait(wait)
+            else:
+                time.sleep(1)  # still something due after a full run: don't spin
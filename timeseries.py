@@ -0,0 +1,136 @@
+# timeseries.py
+"""Numeric metric store: raw samples plus hourly and daily rollups.
+
+record() stores a typed MetricSample next to the display-only Analytics row. rollup(),
+run by the scheduler, re-aggregates only the buckets that can still change: every hour
+from the newest rolled-up hour onwards, then the days those hours fall in. series()
+answers chart queries from the rollups, one row per bucket, so long ranges stay cheap
+however many raw samples pile up. Raw samples older than METRIC_RAW_RETENTION_DAYS are
+dropped once rolled up.
+"""
+import math
+import os
+from datetime import datetime, timedelta
+
+import sqlalchemy as sa
+
+from models import MetricRollup, MetricSample, db
+
+STEPS = ("hour", "day")
+RAW_RETENTION_DAYS = int(os.getenv("METRIC_RAW_RETENTION_DAYS", 30))
+MAX_POINTS = 2000
+
+
+def floor(ts: datetime, step: str) -> datetime:
+    ts = ts.replace(minute=0, second=0, microsecond=0)
+    return ts.replace(hour=0) if step == "day" else ts
+
+
+def parse_value(value):
+    try:
+        v = float(value)
+    except (TypeError, ValueError):
+        return None
+    return v if math.isfinite(v) else None
+
+
+def record(name: str, value, ts: datetime | None = None) -> bool:
+    """Add a sample to the current session if `value` is numeric; the caller commits."""
+    v = parse_value(value)
+    if v is None:
+        return False
+    db.session.add(MetricSample(metric_name=name, ts=ts or datetime.utcnow(), value=v))
+    return True
+
+
+def _combine(rows, step: str):
+    """Merge (metric, ts, count, total, min, max, last, last_ts) tuples into `step` buckets."""
+    out = {}
+    for metric, ts, count, total, lo, hi, last, last_ts in rows:
+        key = (metric, floor(ts, step))
+        agg = out.get(key)
+        if agg is None:
+            out[key] = {
+                "metric_name": metric, "step": step, "bucket": key[1], "count": count, "total": total,
+                "min": lo, "max": hi, "last": last, "last_ts": last_ts,
+            }
+            continue
+        agg["count"] += count
+        agg["total"] += total
+        agg["min"] = min(agg["min"], lo)
+        agg["max"] = max(agg["max"], hi)
+        if last_ts >= agg["last_ts"]:
+            agg["last"], agg["last_ts"] = last, last_ts
+    return list(out.values())
+
+
+def _replace(step: str, since: datetime, rows):
+    db.session.execute(sa.delete(MetricRollup).where(MetricRollup.step == step, MetricRollup.bucket >= since))
+    if rows:
+        db.session.execute(sa.insert(MetricRollup), rows)
+
+
+def rollup(since: datetime | None = None, now: datetime | None = None) -> int:
+    """Recompute hour buckets from `since` (default: the newest rolled-up hour) and their days.
+
+    Returns the number of hour buckets written. Pass `since` to rebuild older history,
+    e.g. after backfilling samples.
+    """
+    now = now or datetime.utcnow()
+    if since is None:
+        since = db.session.scalar(sa.select(sa.func.max(MetricRollup.bucket)).where(MetricRollup.step == "hour"))
+    if since is None:
+        since = db.session.scalar(sa.select(sa.func.min(MetricSample.ts)))
+    if since is None:
+        return 0
+    hour_start = floor(since, "hour")
+    samples = db.session.execute(
+        sa.select(MetricSample.metric_name, MetricSample.ts, MetricSample.value).where(MetricSample.ts >= hour_start)
+    ).all()
+    hours = _combine(((m, ts, 1, v, v, v, v, ts) for m, ts, v in samples), "hour")
+    _replace("hour", hour_start, hours)
+
+    day_start = floor(hour_start, "day")
+    hourly = db.session.execute(
+        sa.select(
+            MetricRollup.metric_name, MetricRollup.bucket, MetricRollup.count, MetricRollup.total,
+            MetricRollup.min, MetricRollup.max, MetricRollup.last, MetricRollup.last_ts,
+        ).where(MetricRollup.step == "hour", MetricRollup.bucket >= day_start)
+    ).all()
+    _replace("day", day_start, _combine(hourly, "day"))
+
+    cutoff = min(hour_start, now - timedelta(days=RAW_RETENTION_DAYS))
+    db.session.execute(sa.delete(MetricSample).where(MetricSample.ts < cutoff))
+    db.session.commit()
+    return len(hours)
+
+
+def default_step(start: datetime, end: datetime) -> str:
+    return "hour" if end - start <= timedelta(days=14) else "day"
+
+
+def series(metric: str, start: datetime, end: datetime, step: str):
+    """Points for `metric` in [start, end): one per rolled-up bucket, or raw samples for step="raw"."""
+    if step == "raw":
+        rows = db.session.execute(
+            sa.select(MetricSample.ts, MetricSample.value)
+            .where(MetricSample.metric_name == metric, MetricSample.ts >= start, MetricSample.ts < end)
+            .order_by(MetricSample.ts)
+            .limit(MAX_POINTS)
+        ).all()
+        return [{"t": ts.isoformat(), "value": v} for ts, v in rows]
+    rows = db.session.execute(
+        sa.select(MetricRollup.bucket, MetricRollup.count, MetricRollup.total, MetricRollup.min, MetricRollup.max, MetricRollup.last)
+        .where(
+            MetricRollup.metric_name == metric,
+            MetricRollup.step == step,
+            MetricRollup.bucket >= floor(start, step),
+            MetricRollup.bucket < end,
+        )
+        .order_by(MetricRollup.bucket)
+        .limit(MAX_POINTS)
+    ).all()
+    return [
+        {"t": r.bucket.isoformat(), "count": r.count, "min": r.min, "max": r.max, "avg": r.total / r.count, "last": r.last}
+        for r in rows
+    ]